@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+
+Benchmarks for the processing stages.
+
+    python bench.py [capture file] [seconds] [options]
+
+The whole pipeline, from reading the capture to mining the hop sequence, is
+timed stage by stage. Without a capture file it runs on a synthetic hopping
+capture (see synth.py) and the hops it finds are checked against the ones
+that were put in, failing when too few are right. The fft and channelizer
+front ends are timed and checked the same way on it. The stage by stage
+comparisons with the original loops then run on random complex64 noise.
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from spectrum import iter_spectra, frame_spectra
+from capture import iter_blocks, capture_frames
+from peaks import peakdet_loop, peakdet, peakdet_batch, split_frames
+from detect import detect_frames_loop, detect_frames, cluster_peaks
+from detections import Detections, from_final
+from cleanup import clean_detections
+from patterns import analyze_sequence
+from metrics import Metrics
+import channelizer
+from replay import replay
+from stream import stream_detect
+import synth
+
+# Sample rate, frame size, peak delta and mapper used by files.py
+samp_rate = 20000000
+t = 1000
+delta = .1
+mapper = (1800000*t)/samp_rate
+
+# Function for printing a single benchmark result
+def report(name, seconds, n_samples):
+    print('{:<28} {:9.3f} s {:12.3e} samples/s'.format(name, seconds, \
+                                                     n_samples/seconds))
+
+# Time the fastest of repeat calls of func
+def best_of(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+# Read in seconds worth of samples from a capture file, or make some noise up
+def load_samples(path=None, seconds=.5):
+    n = int(seconds*samp_rate)
+    if path is None:
+        rng = np.random.default_rng(0)
+        return (rng.standard_normal(n) + \
+                1j*rng.standard_normal(n)).astype(np.complex64)
+    return np.fromfile(path, dtype=np.complex64, count=n)
+
+# The per frame loop processInput used to run
+def loop_spectra(samples):
+    iters = int(len(samples)/t)
+    out = []
+    for frame in range(1, iters):
+        small_test = samples[(frame-1)*t:frame*t]
+        test_fft = np.fft.fft(small_test)
+        freq = np.fft.fftfreq(small_test.shape[-1])
+        out.append(abs(test_fft)/t)
+    return np.array(out)
+
+# The batched version over the same frames
+def batch_spectra(samples):
+    iters = int(len(samples)/t)
+    return np.concatenate([s for _, s in iter_spectra(samples, t, \
+                                                      stop=iters-1)])
+
+def bench_stft(samples):
+    loop_time, loop_out = best_of(lambda: loop_spectra(samples))
+    batch_time, batch_out = best_of(lambda: batch_spectra(samples))
+
+    report('fft loop', loop_time, len(samples))
+    report('fft batch', batch_time, len(samples))
+    print('speedup {:.1f}x, max difference {:.3e}'.format( \
+          loop_time/batch_time, np.max(np.abs(loop_out - batch_out))))
+
+# Check that the vectorized peak detectors give exactly what the loop gives
+# for every frame. Returns the frames that don't match.
+def check_peakdet(spectra, loop_tabs, vec_tabs, batch_tabs):
+    bad = []
+    maxtabs = split_frames(batch_tabs[0], len(spectra))
+    mintabs = split_frames(batch_tabs[1], len(spectra))
+    for frame in range(len(spectra)):
+        maxtab, mintab = loop_tabs[frame]
+        # An empty loop result is 1-D, the batch split is (0, 2)
+        maxtab = maxtab.reshape(-1, 2)
+        mintab = mintab.reshape(-1, 2)
+        if not (np.array_equal(maxtab, vec_tabs[frame][0].reshape(-1, 2)) and \
+                np.array_equal(mintab, vec_tabs[frame][1].reshape(-1, 2)) and \
+                np.array_equal(maxtab, maxtabs[frame]) and \
+                np.array_equal(mintab, mintabs[frame])):
+            bad.append(frame)
+    return bad
+
+def bench_peakdet(samples):
+    spectra = batch_spectra(samples)
+
+    # The loop is slow enough that once is plenty
+    loop_time, loop_tabs = best_of(lambda: [peakdet_loop(v, delta) \
+                                            for v in spectra], 1)
+    vec_time, vec_tabs = best_of(lambda: [peakdet(v, delta) \
+                                          for v in spectra])
+    batch_time, batch_tabs = best_of(lambda: peakdet_batch(spectra, delta))
+
+    report('peakdet loop', loop_time, len(samples))
+    report('peakdet vectorized', vec_time, len(samples))
+    report('peakdet batch', batch_time, len(samples))
+
+    bad = check_peakdet(spectra, loop_tabs, vec_tabs, batch_tabs)
+    print('{} peaks in {} frames, {} frames differ'.format( \
+          len(batch_tabs[0]), len(spectra), len(bad)))
+    if bad:
+        print('first differing frame: ' + str(bad[0] + 1))
+    return not bad
+
+# Check that the clustering of every frame at once keeps the same maxima as
+# the per frame loop, with the mapper files.py uses and with one in the
+# units of the positions so that frames keep several maxima
+def bench_detect(samples):
+    spectra = batch_spectra(samples)
+    same = True
+
+    for m in (mapper, mapper/t):
+        loop_time, loop_found = best_of(lambda: detect_frames_loop( \
+                                        spectra, 0, delta, m, t), 1)
+        batch_time, batch_found = best_of(lambda: detect_frames( \
+                                          spectra, 0, delta, m, t))
+
+        report('detect loop, mapper ' + str(m), loop_time, len(samples))
+        report('detect batch, mapper ' + str(m), batch_time, len(samples))
+        match = np.array_equal(from_final(loop_found, 0, samp_rate), \
+                               batch_found)
+        print('{} detections, {}'.format(len(batch_found), \
+              'identical' if match else 'DIFFERENT'))
+        same = same and match
+    return same
+
+# Pipeline stages in the order they run
+stages = ['load', 'fft', 'peakdet', 'clustering', 'post-proc', 'sequence']
+
+# Time every stage of files.py, post-proc.py and sequence.py on a capture.
+# Returns the metrics, the raw and cleaned detections and the sequence
+# analysis
+def run_pipeline(path, center_freq, max_gap=700, min_shift=900000):
+    metrics = Metrics()
+    final = Detections()
+
+    # The last frame is left out, like files.py does
+    stop = capture_frames(path, t) - 1
+    for first, samples in metrics.timed(iter_blocks(path, t, stop=stop), \
+                                        'load'):
+        metrics.count('samples', len(samples))
+        with metrics.stage('fft'):
+            spectra = frame_spectra(samples, t)
+        with metrics.stage('peakdet'):
+            tab = peakdet_batch(spectra, delta)[0]
+        with metrics.stage('clustering'):
+            final.extend(cluster_peaks(tab, first, mapper, t, center_freq, \
+                                       samp_rate))
+
+    with metrics.stage('post-proc'):
+        detections = final.to_array()
+        cleaned = clean_detections(detections, max_gap, min_shift)
+
+    with metrics.stage('sequence'):
+        mhz = np.round(cleaned['freq_hz']/1000000).astype(np.int64)
+        result = analyze_sequence(mhz, cleaned['frame'])
+
+    return metrics, detections, cleaned, result
+
+# Peak resident memory of this process so far, in MB
+def peak_rss():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kB, macOS bytes
+    if sys.platform == 'darwin':
+        return rss/2**20
+    return rss/2**10
+
+def bench_pipeline(path, center_freq):
+    metrics, detections, cleaned, result = run_pipeline(path, center_freq)
+
+    n_samples = metrics.counts['samples']
+    for name in stages:
+        report(name, metrics.times[name], n_samples)
+    report('total', sum(metrics.times.values()), n_samples)
+    print('{} detections, {} after post-proc, peak RSS {:.0f} MB'.format( \
+          len(detections), len(cleaned), peak_rss()))
+    if result is not None:
+        print('period {} hops, pattern {}'.format(result.period, \
+              list(result.pattern.symbols)))
+    return detections, cleaned, result
+
+# The fft front end on its own, what files.py does to a capture
+def fft_front_end(path, center_freq):
+    final = Detections()
+    stop = capture_frames(path, t) - 1
+    for first, samples in iter_blocks(path, t, stop=stop):
+        spectra = frame_spectra(samples, t)
+        tab = peakdet_batch(spectra, delta)[0]
+        final.extend(cluster_peaks(tab, first, mapper, t, center_freq, \
+                                   samp_rate))
+    return final.to_array()
+
+# The channelizer front end over the same frames, with the pipeline's
+# default settings
+def channel_front_end(path, center_freq, taps=8, threshold=6.):
+    n_channels = channelizer.default_channels(samp_rate)
+    h = channelizer.prototype(n_channels, taps)
+    avg = max(1, t//n_channels)
+    stop = (capture_frames(path, t) - 1)*t//(avg*n_channels)
+    final = Detections()
+    for found in channelizer.channel_hops(path, n_channels, h, avg, \
+                                          threshold, t, samp_rate, 0, stop, \
+                                          center_freq):
+        final.extend(found)
+    return final.to_array()
+
+# Time both front ends on a synthetic capture and score what each found.
+# Returns the channelizer's scores
+def bench_front_ends(path, center_freq, schedule, n_frames):
+    fft_time, fft_found = best_of(lambda: fft_front_end(path, center_freq))
+    channel_time, channel_found = best_of(lambda: channel_front_end( \
+                                              path, center_freq))
+    n_samples = n_frames*t
+
+    for name, seconds, found in (('fft front end', fft_time, fft_found), \
+                                 ('channelizer front end', channel_time, \
+                                  channel_found)):
+        report(name, seconds, n_samples)
+        accuracy = synth.score(found, schedule, n_frames, t, synth.bw)
+        print('{} detections, precision {:.3f}, recall {:.3f}'.format( \
+              accuracy['detections'], accuracy['precision'], \
+              accuracy['recall']))
+    print('channelizer speedup {:.2f}x'.format(fft_time/channel_time))
+    return accuracy
+
+# Make a synthetic capture, run the pipeline on it and check what it found
+# against the hops that are really there
+def bench_synthetic(args):
+    hops = np.array(args.hops)*1000000
+    n = int(args.seconds*samp_rate)
+    schedule = synth.hop_schedule(n, hops, args.dwell, args.gap, samp_rate)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, str(args.center))
+        tic = time.perf_counter()
+        synth.fhss_samples(schedule, n, args.center, args.snr, \
+                           samp_rate=samp_rate, seed=args.seed).tofile(path)
+        print('synthetic capture: {:.2f} s, {} hops, SNR {} dB, ' \
+              'made in {:.1f} s'.format(args.seconds, len(schedule), \
+                                        args.snr, time.perf_counter() - tic))
+        detections, cleaned, result = bench_pipeline(path, args.center)
+        channel = bench_front_ends(path, args.center, schedule, n//t - 1)
+
+    accuracy = synth.score(detections, schedule, n//t - 1, t, synth.bw)
+    print('precision {:.3f}, recall {:.3f}'.format(accuracy['precision'], \
+                                                   accuracy['recall']))
+
+    # Every hop should survive post-proc as one detection, and the mined
+    # pattern should be the hop set in some rotation
+    cycle = (hops//1000000).tolist()
+    found = [] if result is None else list(result.pattern.symbols)
+    pattern_ok = len(found) == len(cycle) and \
+                 any(found == cycle[i:] + cycle[:i] for i in range(len(cycle)))
+    print('{} hops, {} after post-proc, pattern {}'.format(len(schedule), \
+          len(cleaned), 'found' if pattern_ok else 'NOT found'))
+
+    return all(a['precision'] >= args.min_precision and \
+               a['recall'] >= args.min_recall for a in (accuracy, channel)) \
+           and pattern_ok
+
+# Sequences the pattern search has nothing to find in, like a capture that
+# only ever saw 2475 MHz. They should come back as no pattern, not blow up
+def check_sequences():
+    cases = {'one frequency' : [2475]*6,
+             'too short'     : [2475, 2460],
+             'empty'         : [],
+             }
+    ok = True
+    for name, symbols in cases.items():
+        try:
+            result = analyze_sequence(symbols)
+        except Exception as e:
+            result = e
+        print('sequence check, {}: {}'.format(name, \
+              'ok' if result is None else 'FAILED (' + repr(result) + ')'))
+        ok = ok and result is None
+    return ok
+
+# Replay a capture into stream.py's detector through a pipe, the producer
+# only starting after delay seconds like a radio that takes a while to come
+# up. Waiting for the first samples isn't falling behind, so nothing should
+# be dropped. A low sample rate keeps the capture small
+def check_stream(seconds=1., delay=1.5, rate=2000000, max_backlog=.5):
+    rng = np.random.default_rng(0)
+    n = int(seconds*rate)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'capture')
+        (rng.standard_normal(n) + \
+         1j*rng.standard_normal(n)).astype(np.complex64).tofile(path)
+
+        r, w = os.pipe()
+        def produce():
+            time.sleep(delay)
+            with os.fdopen(w, 'wb') as out:
+                replay(path, out, rate)
+        producer = threading.Thread(target=produce)
+        producer.start()
+        with os.fdopen(r, 'rb') as f:
+            stats = stream_detect(f, lambda found: None, t, delta=delta, \
+                                  mapper=mapper, samp_rate=rate, block=100, \
+                                  max_backlog=max_backlog)
+        producer.join()
+
+    ok = stats.dropped == 0 and stats.samples == n//t*t
+    print('stream check, producer {} s late: {} ({} samples, {} dropped, ' \
+          'backlog {:.3f} s)'.format(delay, 'ok' if ok else 'FAILED', \
+                                     stats.samples, stats.dropped, \
+                                     stats.backlog))
+    return ok
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pipeline benchmarks')
+    parser.add_argument('capture', nargs='?', default=None)
+    parser.add_argument('seconds', nargs='?', type=float, default=.5)
+    parser.add_argument('--center', type=int, default=None, \
+                        help='center frequency in MHz, the capture file ' + \
+                             'name by default')
+    parser.add_argument('--hops', type=int, nargs='+', \
+                        default=[2452, 2457, 2459, 2462, 2466], \
+                        help='synthetic hop frequencies in MHz, in order')
+    parser.add_argument('--dwell', type=float, default=.01)
+    parser.add_argument('--gap', type=float, default=.002)
+    parser.add_argument('--snr', type=float, default=0.)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--min-precision', type=float, default=.95)
+    parser.add_argument('--min-recall', type=float, default=.95)
+    parser.add_argument('--pipeline-only', action='store_true', \
+                        help='skip the comparisons with the original loops')
+    args = parser.parse_args()
+
+    ok = True
+    if args.capture is None:
+        if args.center is None:
+            args.center = 2460
+        ok = bench_synthetic(args)
+    else:
+        if args.center is None:
+            name = os.path.basename(args.capture)
+            args.center = int(name) if name.isdigit() else 0
+        bench_pipeline(args.capture, args.center)
+
+    ok = check_sequences() and ok
+    ok = check_stream() and ok
+
+    if not args.pipeline_only:
+        samples = load_samples(args.capture, args.seconds)
+        bench_stft(samples)
+        ok = bench_peakdet(samples) and ok
+        ok = bench_detect(samples) and ok
+
+    if not ok:
+        sys.exit(1)
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+
+On disk cache of frame magnitude spectra, so rerunning the detection with a
+different delta or mapper doesn't redo every fft of the capture.
+
+Every (capture, t, overlap, window, dtype) gets an entry of three files in
+the cache directory:
+
+    <name>.spec  - the spectra, one row of t values per frame, memory mapped
+    <name>.done  - one byte per frame, set once that frame's row is written
+    <name>.json  - what the entry was made from. Its modification time is
+                   when the entry was last used
+
+Frames are only computed the first time they are asked for, so a run over
+part of a capture caches just that part. Entries are thrown away when the
+capture changes (size or modification time) and the least recently used
+ones are evicted to keep the cache under its disk budget.
+"""
+import hashlib
+import json
+import os
+import numpy as np
+from capture import open_capture, capture_frames
+from spectrum import block_frames, frame_spectra, iter_spectra
+
+# Where the cache lives and how much disk it may take up, in bytes
+cache_dir = './spectra'
+budget = 20*2**30
+
+def window_id(window):
+    """
+    Short text naming a window: its name, 'none' for rectangular or a hash of
+    the coefficients.
+    """
+    if window is None:
+        return 'none'
+    if isinstance(window, str):
+        return window
+    data = np.ascontiguousarray(window, dtype=np.float64)
+    return 'sha1-' + hashlib.sha1(data.tobytes()).hexdigest()[:16]
+
+class SpectrumCache:
+    """
+    Cache of the spectra of capture files in directory, using at most budget
+    bytes. dtype is what the spectra are stored as, float32 keeps them
+    exactly (the ffts are single precision), float16 halves the disk and I/O
+    at the cost of about 3 significant digits.
+    """
+    def __init__(self, directory=cache_dir, budget=budget, dtype=np.float32):
+        self.directory = directory
+        self.budget = budget
+        self.dtype = np.dtype(dtype)
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name, ext):
+        return os.path.join(self.directory, name + ext)
+
+    def key(self, path, t, overlap=0, window=None):
+        """
+        Entry name and description of the spectra of a capture.
+        """
+        info = {'capture' : os.path.abspath(path),
+                't'       : t,
+                'overlap' : overlap,
+                'window'  : window_id(window),
+                'dtype'   : self.dtype.name,
+                }
+        name = hashlib.sha1(json.dumps(info, sort_keys=True).encode()) \
+                      .hexdigest()[:20]
+        return name, info
+
+    def entries(self):
+        """
+        Every entry in the cache as a list of (name, info, bytes, last used),
+        least recently used first.
+        """
+        found = []
+        for file_name in os.listdir(self.directory):
+            name, ext = os.path.splitext(file_name)
+            if ext != '.json':
+                continue
+            try:
+                with open(self._path(name, '.json')) as f:
+                    info = json.load(f)
+                used = os.path.getmtime(self._path(name, '.json'))
+            except (OSError, ValueError):
+                continue
+            found.append((name, info, info.get('bytes', 0), used))
+        found.sort(key=lambda entry: entry[3])
+        return found
+
+    def remove(self, name):
+        """
+        Deletes an entry. The metadata goes first so a half removed entry is
+        never mistaken for a good one.
+        """
+        for ext in ('.json', '.done', '.spec'):
+            try:
+                os.remove(self._path(name, ext))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        for name, info, size, used in self.entries():
+            self.remove(name)
+
+    def evict(self, needed=0, keep=()):
+        """
+        Removes the least recently used entries until needed more bytes fit
+        in the budget. Entries named in keep are left alone. Returns the
+        names removed.
+        """
+        entries = self.entries()
+        total = sum(size for name, info, size, used in entries)
+        removed = []
+        for name, info, size, used in entries:
+            if total + needed <= self.budget:
+                break
+            if name in keep:
+                continue
+            self.remove(name)
+            total -= size
+            removed.append(name)
+        return removed
+
+    def open(self, path, t, overlap=0, window=None):
+        """
+        Opens (creating it if needed) the entry for a capture. Returns the
+        spectra and done arrays, both memory mapped read/write, or None when
+        the spectra would not fit in the budget.
+
+        Creating an entry that already exists is harmless, so several
+        workers can open the same capture at once and fill in different
+        frames.
+        """
+        name, info = self.key(path, t, overlap, window)
+        stat = os.stat(path)
+        info['size'] = stat.st_size
+        info['mtime_ns'] = stat.st_mtime_ns
+        info['frames'] = capture_frames(path, t, overlap)
+        info['bytes'] = info['frames']*t*self.dtype.itemsize + info['frames']
+
+        if info['bytes'] > self.budget:
+            return None
+
+        # A capture that changed since it was cached invalidates its spectra
+        try:
+            with open(self._path(name, '.json')) as f:
+                old = json.load(f)
+        except (OSError, ValueError):
+            old = None
+        if old is not None and old != info:
+            self.remove(name)
+            old = None
+
+        if old is None:
+            self.evict(info['bytes'], keep=(name,))
+            # Grow the files to size without touching what is already in
+            # them. Unwritten parts read back as zeros and take no disk
+            for ext, size in (('.spec', info['bytes'] - info['frames']), \
+                              ('.done', info['frames'])):
+                with open(self._path(name, ext), 'ab') as f:
+                    f.truncate(size)
+            tmp = self._path(name, '.json.' + str(os.getpid()))
+            with open(tmp, 'w') as f:
+                json.dump(info, f)
+            os.replace(tmp, self._path(name, '.json'))
+        else:
+            os.utime(self._path(name, '.json'))
+
+        n = info['frames']
+        if n == 0:
+            return (np.empty((0, t), dtype=self.dtype), \
+                    np.empty(0, dtype=np.uint8))
+        spectra = np.memmap(self._path(name, '.spec'), dtype=self.dtype, \
+                            mode='r+', shape=(n, t))
+        done = np.memmap(self._path(name, '.done'), dtype=np.uint8, \
+                         mode='r+', shape=(n,))
+        return spectra, done
+
+    def spectra(self, path, t, overlap=0, window=None, start=0, stop=None, \
+                block=block_frames):
+        """
+        Generator over the frame spectra of a capture, block frames at a time,
+        like spectrum.iter_spectra. Frames that are already cached are read
+        back, the rest are computed and stored on the way through. Yields
+        (first frame index, 2-D float32 magnitude array).
+
+        Falls back to computing everything when the capture is too big for
+        the budget.
+        """
+        opened = self.open(path, t, overlap, window)
+        samples = open_capture(path)
+        if opened is None:
+            for first, spectra in iter_spectra(samples[start*(t - overlap):], \
+                                               t, overlap, window, block, \
+                                               None if stop is None else \
+                                               stop - start):
+                yield start + first, spectra
+            return
+
+        cached, done = opened
+        hop = t - overlap
+        n = len(done) if stop is None else min(len(done), stop)
+
+        for first in range(start, n, block):
+            last = min(first + block, n)
+
+            # One fft call covers every frame of the block that is missing.
+            # The row is written before it is marked done so an interrupted
+            # run never leaves a frame marked that isn't there
+            todo = np.flatnonzero(done[first:last] == 0)
+            if len(todo) > 0:
+                a = first + todo[0]
+                b = first + todo[-1] + 1
+                cached[a:b] = frame_spectra(samples[a*hop:(b - 1)*hop + t], \
+                                            t, overlap, window)
+                done[a:b] = 1
+
+            yield first, np.asarray(cached[first:last], dtype=np.float32)
+
+    def load(self, path, t, overlap=0, window=None):
+        """
+        The spectra of a whole capture as a read only (frames x t) memory
+        map, computing whatever is not cached yet. Returns None when the
+        capture is too big for the budget.
+        """
+        opened = self.open(path, t, overlap, window)
+        if opened is None:
+            return None
+        for first, spectra in self.spectra(path, t, overlap, window):
+            pass
+        cached, done = opened
+        if len(done) == 0:
+            return cached
+        return np.memmap(cached.filename, dtype=self.dtype, mode='r', \
+                         shape=cached.shape)
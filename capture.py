@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+"""
+import os
+import numpy as np
+from spectrum import block_frames, frame_count
+
+# GNU Radio file sinks write interleaved float32 I/Q
+sample_type = np.complex64
+sample_size = np.dtype(sample_type).itemsize
+
+def open_capture(path):
+    """
+    Memory maps a capture file. Nothing is read until it is sliced, so this
+    is the cheap way to get at a few frames of a very long capture.
+    """
+    if os.path.getsize(path) < sample_size:
+        return np.empty(0, dtype=sample_type)
+    return np.memmap(path, dtype=sample_type, mode='r')
+
+def capture_frames(path, t, overlap=0):
+    """
+    Number of frames in a capture file without reading it.
+    """
+    return frame_count(os.path.getsize(path)//sample_size, t, overlap)
+
+def time_to_frame(seconds, t, overlap=0, samp_rate=20000000):
+    """
+    Index of the frame that starts at (or just before) seconds into the
+    capture.
+    """
+    return int(seconds*samp_rate)//(t - overlap)
+
+def read_into(f, buf):
+    """
+    Fills as much of the sample array buf as the file will give us and
+    returns the number of samples read. Pipes and sockets hand data over in
+    pieces so this keeps reading until the buffer is full or the data ends.
+    """
+    view = memoryview(buf).cast('B')
+    got = 0
+    while got < len(view):
+        n = f.readinto(view[got:])
+        if not n:
+            break
+        got += n
+    return got//sample_size
+
+def skip_samples(f, count, chunk=1 << 20):
+    """
+    Reads and throws away count samples of a stream we can't seek in.
+    Returns the number of samples skipped.
+    """
+    buf = np.empty(min(count, chunk), dtype=sample_type)
+    skipped = 0
+    while skipped < count:
+        got = read_into(f, buf[:min(count - skipped, chunk)])
+        if got == 0:
+            break
+        skipped += got
+    return skipped
+
+def iter_blocks(source, t, overlap=0, block=block_frames, start=0, \
+                stop=None):
+    """
+    Reads a capture (a path or an open binary file, pipe included) block
+    frames at a time. Yields (first frame index, samples) where samples holds
+    exactly the frames from first onwards. Samples that belong to the next
+    block as well (when frames overlap, or a partial frame at the end of a
+    read) are carried over, so every frame comes out exactly once.
+
+    Only start frames are skipped and at most block frames worth of samples
+    are ever held, no matter how long the capture is. The samples array is
+    reused, it is only valid until the next block is read.
+    """
+    if isinstance(source, (str, bytes, os.PathLike)):
+        with open(source, 'rb') as f:
+            yield from iter_blocks(f, t, overlap, block, start, stop)
+        return
+
+    hop = t - overlap
+    if hop <= 0:
+        raise ValueError('overlap must be smaller than t')
+
+    # Get to the first frame we were asked for
+    if start > 0:
+        if source.seekable():
+            source.seek(start*hop*sample_size, os.SEEK_CUR)
+        else:
+            skip_samples(source, start*hop)
+
+    buf = np.empty((block - 1)*hop + t, dtype=sample_type)
+    have = 0
+    frame = start
+
+    while stop is None or frame < stop:
+        n = block if stop is None else min(block, stop - frame)
+        want = (n - 1)*hop + t
+
+        # Top the buffer up behind whatever was carried over. A short read
+        # means the capture is finished
+        have += read_into(source, buf[have:want])
+        finished = have < want
+
+        n = frame_count(have, t, overlap)
+        if n == 0:
+            break
+
+        yield frame, buf[:(n - 1)*hop + t]
+
+        if finished:
+            break
+
+        # Move the samples the next frame starts with to the front
+        frame += n
+        used = n*hop
+        buf[:have - used] = buf[used:have]
+        have -= used
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+
+Polyphase filter bank front end. Splits a capture into n_channels channels
+of samp_rate/n_channels each (about bw wide by default) in one pass, and
+finds the hops by the energy in each channel instead of picking peaks out
+of a full resolution fft of every frame.
+
+Each output of the filter bank takes n_channels new samples: the last
+n_channels*taps samples are weighted by the prototype low pass filter,
+folded into n_channels sums and run through an n_channels point fft. That
+is taps multiply-adds and a short fft per sample, against a 1000 point fft
+and a peak search over 1000 bins per 1000 samples for files.py.
+"""
+import numpy as np
+from scipy import fft
+from spectrum import frame_count
+from capture import iter_blocks
+from detections import from_positions
+
+def default_channels(samp_rate=20000000, bw=1800000):
+    """
+    Number of channels that makes each one about bw wide.
+    """
+    return max(1, int(round(samp_rate/bw)))
+
+def prototype(n_channels, taps=8, beta=6.):
+    """
+    Kaiser windowed sinc low pass filter, n_channels*taps long, cut off at
+    half a channel. Scaled so a tone in the middle of a channel comes out
+    with its own amplitude.
+    """
+    n = np.arange(n_channels*taps) - (n_channels*taps - 1)/2
+    h = np.sinc(n/n_channels)*np.kaiser(n_channels*taps, beta)
+    return (h/h.sum()).astype(np.float32)
+
+def channel_freqs(n_channels, samp_rate=20000000):
+    """
+    Center frequency of each channel relative to the capture's center, in
+    fft order.
+    """
+    return np.fft.fftfreq(n_channels, 1/samp_rate)
+
+def channelize(samples, h, n_channels, tiled=None):
+    """
+    Filter bank outputs for every n_channels samples of samples. Returns a
+    (outputs x n_channels) complex array, output i covering samples
+    i*n_channels to i*n_channels + len(h).
+
+    tiled is the filter as made by tile_filter, for when many blocks of the
+    same size go through.
+    """
+    taps = len(h)//n_channels
+    n = frame_count(len(samples), len(h), len(h) - n_channels)
+    size = 2*n*n_channels
+    if tiled is None or tiled.shape[1] < size:
+        tiled = tile_filter(h, n_channels, n)
+
+    # Tap k of every output's weighted sum is a contiguous run of samples,
+    # k*n_channels on from the start, times the k'th row of the filter over
+    # and over. Working on those runs as plain float32 (real and imaginary
+    # parts side by side) keeps the loops long and the multiplies real
+    x = samples.view(np.float32)
+    folded = x[:size]*tiled[0,:size]
+    part = np.empty_like(folded)
+    for k in range(1, taps):
+        start = 2*k*n_channels
+        np.multiply(x[start:start + size], tiled[k,:size], out=part)
+        folded += part
+    return fft.fft(folded.view(np.complex64).reshape(n, n_channels), \
+                  axis=1, overwrite_x=True)
+
+def tile_filter(h, n_channels, n):
+    """
+    The filter laid out for channelize: one row per tap, each value twice
+    (for the real and imaginary part) and repeated for n outputs.
+    """
+    taps = len(h)//n_channels
+    return np.tile(np.repeat(h, 2).reshape(taps, 2*n_channels), (1, n))
+
+def iter_power(source, n_channels, h, avg, start=0, stop=None, blocks=512, \
+               chunk=32):
+    """
+    Reads a capture (path or open file) and yields (first slot, power) a
+    block of slots at a time, power being the mean power of each channel
+    over slots of avg filter bank outputs. Slots are counted from the start
+    of the capture, start and stop are slots too. Only blocks slots worth of
+    samples are held at once.
+
+    The filter bank runs over chunk slots at a time, which keeps what it
+    works on in cache. A whole block is big enough for the per call cost of
+    the detection to disappear.
+    """
+    outputs = chunk*avg
+    tiled = tile_filter(h, n_channels, outputs)
+
+    for first, samples in iter_blocks(source, len(h), len(h) - n_channels, \
+                                      blocks*avg, start*avg, \
+                                      None if stop is None else stop*avg):
+        # A partial slot at the end of the capture is dropped
+        n = frame_count(len(samples), len(h), len(h) - n_channels)//avg
+        if n == 0:
+            break
+
+        power = np.empty((n, n_channels), dtype=np.float32)
+        for i in range(0, n, chunk):
+            m = min(chunk, n - i)
+            out = channelize(samples[i*avg*n_channels:((i + m)*avg - 1)* \
+                                     n_channels + len(h)], h, n_channels, \
+                             tiled)
+
+            # Square the real and imaginary parts in place, sum them over
+            # each slot and then add the two together
+            parts = out.view(np.float32)
+            np.multiply(parts, parts, out=parts)
+            power[i:i + m] = parts.reshape(m, avg, n_channels, 2) \
+                                  .sum(axis=1).sum(axis=2)
+        yield first//avg, power/avg
+
+def detect_energy(power, freqs, threshold=6.):
+    """
+    Finds the hops in a (slots x channels) power array. A channel is lit when
+    its power is threshold dB above the median over the channels of its slot
+    (most channels hold only noise). Lit channels and their neighbours are
+    one hop, found at the mean of their frequencies weighted by the power
+    above the median. Counting the neighbours keeps the frequency of a hop
+    steady when it sits between two channels and only sometimes lights both.
+
+    Returns the slot, frequency (Hz, relative to the center) and amplitude
+    (square root of the strongest channel's power) of every hop, slot by
+    slot and in frequency order within a slot.
+    """
+    order = np.argsort(freqs)
+    power = power[:,order]
+    freqs = freqs[order]
+    n = power.shape[1]
+
+    floor = np.median(power, axis=1, keepdims=True)
+    lit = power > floor*10**(threshold/10)
+    near = lit.copy()
+    near[:,1:] |= lit[:,:-1]
+    near[:,:-1] |= lit[:,1:]
+
+    # A hop starts at every channel near a lit one whose lower neighbour
+    # isn't
+    starts = near.copy()
+    starts[:,1:] &= ~near[:,:-1]
+
+    idx = np.flatnonzero(near)
+    if len(idx) == 0:
+        return idx, np.empty(0), np.empty(0)
+    hop = np.cumsum(starts.ravel()[idx]) - 1
+    weights = (power - floor).clip(0).ravel()[idx]
+    centers = np.bincount(hop, weights*freqs[idx % n])/ \
+              np.bincount(hop, weights)
+    first = np.flatnonzero(starts.ravel()[idx])
+    peaks = np.maximum.reduceat(power.ravel()[idx], first)
+
+    return idx[first]//n, centers, np.sqrt(peaks)
+
+def channel_hops(source, n_channels, h, avg, threshold=6., t=1000, \
+                 samp_rate=20000000, start=0, stop=None, center_freq=0, \
+                 overlap=0):
+    """
+    Generator over the hops in a capture, a block of slots at a time, as
+    detection arrays like detect.detect_frames gives (frames of t samples
+    starting every t - overlap samples, counted from 1, frequencies in Hz
+    for a capture at center_freq MHz). Slots are about a frame long, avg
+    filter bank outputs of n_channels samples each.
+    """
+    freqs = channel_freqs(n_channels, samp_rate)
+    # Each output is centered len(h)/2 samples after its first sample
+    delay = (len(h) - n_channels)//2
+
+    for first, power in iter_power(source, n_channels, h, avg, start, stop):
+        slots, centers, peaks = detect_energy(power, freqs, threshold)
+        frames = ((first + slots)*avg*n_channels + delay)//(t - overlap) + 1
+        yield from_positions(centers/samp_rate, frames, peaks, center_freq, \
+                             samp_rate)
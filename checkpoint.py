@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+
+Checkpoints for long detection runs, so a sweep of all the captures that is
+interrupted picks up where it stopped instead of starting over.
+
+Every set of detection settings gets a directory of its own, named by a
+hash of the settings, in the checkpoint directory:
+
+    <id>/manifest.json           - the settings, and for every capture the
+                                   file it was (size and modification
+                                   time), its frame ranges, which of them
+                                   are done and whether it is complete
+    <id>/<capture>_<start>_<stop>.npy
+                                 - the detections of one frame range
+
+A range's file is written (to a temporary name, then renamed) as soon as
+the range is done, and it is what says the range is done: the manifest is
+a summary rebuilt from the files that are there. Several machines can
+share a checkpoint directory, runs with different settings never touch
+each other's files and two runs with the same settings at worst do a range
+twice.
+"""
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from cache import window_id
+from detections import detection_dtype
+
+# The settings that change what is detected. The rest (jobs, cache, images,
+# output) can change between a run and its resumption
+params = ['samp_rate', 't', 'bw', 'delta', 'overlap', 'window', \
+          'cfar_margin', 'floor_chunk', 'floor_history', 'floor_percentile', \
+          'front_end', 'n_channels', 'channel_taps', 'energy_threshold', \
+          'cache_dtype']
+
+def param_set(config):
+    """
+    The settings of config that are checkpointed, as a dict ready for JSON.
+    """
+    found = {name : getattr(config, name) for name in params}
+    found['window'] = window_id(config.window)
+    # The cache only changes the results when it rounds the spectra
+    if config.cache_dir is None:
+        found['cache_dtype'] = None
+    # The noise floor chunks are counted from the first frame of the run, so
+    # with the gate on a frame's detections depend on where the run started
+    if config.cfar_margin is not None:
+        found['start_frame'] = config.start_frame
+    return found
+
+def write_atomic(path, write):
+    """
+    Calls write with a file opened for writing and puts it at path once it
+    is complete, so path is either missing or whole.
+    """
+    tmp = path + '.' + str(os.getpid()) + '.tmp'
+    with open(tmp, 'wb') as f:
+        write(f)
+    os.replace(tmp, path)
+
+class Checkpoint:
+    """
+    The finished frame ranges of a run with config's settings, kept in
+    directory.
+    """
+    def __init__(self, directory, config):
+        self.params = param_set(config)
+        self.id = hashlib.sha1(json.dumps(self.params, sort_keys=True) \
+                                   .encode()).hexdigest()[:16]
+        self.directory = os.path.join(directory, self.id)
+        os.makedirs(self.directory, exist_ok=True)
+        self.manifest = self._read()
+
+    def _path(self, name, start, stop):
+        return os.path.join(self.directory, name + '_' + str(start) + '_' + \
+                            str(stop) + '.npy')
+
+    def _read(self):
+        try:
+            with open(os.path.join(self.directory, 'manifest.json')) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        manifest['params'] = self.params
+        manifest.setdefault('captures', {})
+        return manifest
+
+    def _write(self):
+        data = json.dumps(self.manifest, indent=1).encode()
+        write_atomic(os.path.join(self.directory, 'manifest.json'), \
+                     lambda f: f.write(data))
+
+    def done(self, name, start, stop):
+        return os.path.exists(self._path(name, start, stop))
+
+    def begin(self, name, path, ranges):
+        """
+        Starts (or resumes) a capture to be done in the frame ranges
+        ranges. Throws away what was found in it before if the capture file
+        changed since. Returns the ranges that are still to do.
+        """
+        # The file is known by its size and modification time only, the
+        # machines sharing the directory may have it at different paths
+        stat = os.stat(path)
+        stamp = {'size'     : stat.st_size,
+                 'mtime_ns' : stat.st_mtime_ns,
+                 }
+        # Another run may have written the entry since we read the manifest
+        entry = self._read()['captures'].get(name) or \
+                self.manifest['captures'].get(name, {})
+        # No entry yet says nothing about the files there, only a different
+        # stamp says they are stale
+        if 'size' in entry and \
+           {key : entry.get(key) for key in stamp} != stamp:
+            for file_name in os.listdir(self.directory):
+                if file_name.startswith(name + '_') and \
+                   file_name.endswith('.npy'):
+                    os.remove(os.path.join(self.directory, file_name))
+        entry.update(stamp)
+        entry['path'] = os.path.abspath(path)
+        entry['ranges'] = [list(r) for r in ranges]
+        self.manifest['captures'][name] = entry
+        self._update(name)
+        return [r for r in ranges if not self.done(name, *r)]
+
+    def save(self, name, start, stop, detections):
+        """
+        Stores the detections of a finished frame range.
+        """
+        write_atomic(self._path(name, start, stop), \
+                     lambda f: np.save(f, np.asarray(detections, \
+                                                     dtype=detection_dtype)))
+        self._update(name)
+
+    def load(self, name):
+        """
+        The detections of a capture, joined up from its ranges in order.
+        """
+        ranges = self.manifest['captures'][name]['ranges']
+        return np.concatenate([np.load(self._path(name, *r)) \
+                               for r in ranges] or \
+                              [np.empty(0, dtype=detection_dtype)])
+
+    def complete(self, name):
+        return self.manifest['captures'].get(name, {}).get('complete', False)
+
+    def _update(self, name):
+        # What is done is whatever range files are there
+        entry = self.manifest['captures'][name]
+        done = [r for r in entry['ranges'] if self.done(name, *r)]
+        entry['done'] = done
+        entry['frames_done'] = sum(stop - start for start, stop in done)
+        entry['complete'] = len(done) == len(entry['ranges'])
+        entry['updated'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        self._write()
+
+def campaign(directory):
+    """
+    What every run in a checkpoint directory has done: a dict of settings
+    id -> manifest.
+    """
+    found = {}
+    for run_id in sorted(os.listdir(directory)):
+        try:
+            with open(os.path.join(directory, run_id, 'manifest.json')) as f:
+                found[run_id] = json.load(f)
+        except (OSError, ValueError):
+            continue
+    return found
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+"""
+import json
+import numpy as np
+
+def dedup(frames, freqs, max_gap=700, min_shift=900000):
+    """
+    Returns a mask of the detections to keep. A detection is dropped when
+    it is less than max_gap frames after the last kept one and within
+    min_shift Hz of it, i.e. the same hop seen again. frames must be sorted.
+
+    Whether a detection is kept depends on the last one that was kept, so
+    this is one linear pass over plain ints rather than an array operation.
+    """
+    keep = np.zeros(len(frames), dtype=bool)
+    last_frame = None
+    last_freq = None
+    for i, (frame, freq) in enumerate(zip(np.asarray(frames).tolist(), \
+                                          np.asarray(freqs).tolist())):
+        if last_frame is None or frame - last_frame >= max_gap or \
+           abs(freq - last_freq) > min_shift:
+            keep[i] = True
+            last_frame = frame
+            last_freq = freq
+    return keep
+
+# What a correction rule may say. The first three pick the detections it
+# applies to (all of them when none is given), the rest say what happens
+# to them
+rule_keys = ('mhz', 'capture', 'frames', 'set_hz', 'shift_hz', 'drop', \
+             'note')
+
+def check_rule(rule):
+    """
+    Raises ValueError for a rule that doesn't make sense, so a typo in a
+    rules file is caught before anything is processed.
+    """
+    unknown = set(rule) - set(rule_keys)
+    if unknown:
+        raise ValueError('unknown keys in rule ' + str(rule) + ': ' + \
+                         ', '.join(sorted(unknown)))
+    actions = [key for key in ('set_hz', 'shift_hz', 'drop') if key in rule]
+    if len(actions) != 1:
+        raise ValueError('rule ' + str(rule) + \
+                         ' needs one of set_hz, shift_hz or drop')
+    if 'frames' in rule and len(rule['frames']) != 2:
+        raise ValueError('frames of rule ' + str(rule) + \
+                         ' should be [start, stop]')
+    return rule
+
+def table_rules(corrections):
+    """
+    Rules doing what an old corrections table does: keyed by the frequency
+    in whole MHz, the value is the frequency in Hz it really is or 0 to
+    throw the detection away.
+    """
+    return [{'mhz' : int(mhz), 'drop' : True} if not hz else \
+            {'mhz' : int(mhz), 'set_hz' : int(hz)} \
+            for mhz, hz in corrections.items()]
+
+def load_rules(path):
+    """
+    Reads correction rules from a JSON file, either {"rules" : [...]} (see
+    corrections.json) or an old corrections table of "MHz" : Hz.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict) and 'rules' in data:
+        return [check_rule(rule) for rule in data['rules']]
+    return table_rules(data)
+
+def apply_rules(detections, rules):
+    """
+    Returns detections with the correction rules applied. A rule matches
+    detections by their frequency rounded to whole MHz (mhz, a number or a
+    list), the capture they came from (capture, same) and their frame
+    (frames, [start, stop) with null for no limit), then sets their
+    frequency (set_hz), moves it (shift_hz) or drops them (drop). Each
+    detection gets the first rule that matches it, like a lookup table.
+
+    Every rule is a few array operations over all the detections, so the
+    cost grows with the number of rules and not with how they are written.
+    """
+    if isinstance(rules, dict):
+        rules = table_rules(rules)
+    detections = detections.copy()
+    if not rules or len(detections) == 0:
+        return detections
+
+    freqs = detections['freq_hz']
+    frames = detections['frame']
+    mhz = np.round(freqs/1000000).astype(np.int64)
+    free = np.ones(len(detections), dtype=bool)
+    keep = np.ones(len(detections), dtype=bool)
+
+    for rule in map(check_rule, rules):
+        hit = free.copy()
+        if 'mhz' in rule:
+            hit &= np.isin(mhz, rule['mhz'])
+        if 'capture' in rule:
+            hit &= np.isin(detections['capture'], rule['capture'])
+        if 'frames' in rule:
+            start, stop = rule['frames']
+            if start is not None:
+                hit &= frames >= start
+            if stop is not None:
+                hit &= frames < stop
+
+        if rule.get('drop'):
+            keep &= ~hit
+        elif 'set_hz' in rule:
+            freqs[hit] = rule['set_hz']
+        elif 'shift_hz' in rule:
+            freqs[hit] += rule['shift_hz']
+        free &= ~hit
+
+    return detections[keep]
+
+def clean_detections(detections, max_gap=700, min_shift=900000, \
+                     corrections=None):
+    """
+    The post-processing of a file's detections: drop repeats of the same
+    hop, apply the correction rules (or an old corrections table), and then
+    drop the repeats the corrections created.
+    """
+    detections = detections[dedup(detections['frame'], \
+                                  detections['freq_hz'], max_gap, min_shift)]
+
+    if corrections:
+        detections = apply_rules(detections, corrections)
+        detections = detections[dedup(detections['frame'], \
+                                      detections['freq_hz'], max_gap, \
+                                      min_shift)]
+
+    return detections
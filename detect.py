@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+"""
+import numpy as np
+from peaks import peakdet_batch, split_frames
+from noise import cfar_gate
+from detections import from_positions
+
+# The per frame loop files.py used to run. Kept as the reference
+# detect_frames is checked against (see bench.py)
+def detect_frames_loop(spectra, first=0, delta=.1, mapper=90, t=None):
+    """
+    Finds the hops in a block of frame magnitude spectra. first is the index
+    of the first row in the capture, counting from 0. Returns a list of
+    [frequency, frame, magnitude] with the frequency as a fraction of the
+    sample rate and frames counted from 1, like files.py prints them.
+    """
+    from scipy import signal
+
+    if t is None:
+        t = spectra.shape[1]
+
+    # Initialize the results
+    final = []
+
+    # Use converted MATLAB function to detect the peaks of every fft in 
+    # the block in one go
+    maxtabs = split_frames(peakdet_batch(spectra, delta)[0], len(spectra))
+    
+    for row in range(len(spectra)):
+        frame = first + row + 1
+    
+        # Peaks detected within the fft signal
+        maxtab = maxtabs[row]
+    
+        # Initialize variable used for testing
+        found = []
+    
+        # If there are peaks in this frame proceed here. 
+        # DEBUG
+        # If there are no peaks we append a 0 to the foung array. This gives 
+        # us a little more information around when the signal is at it's 
+        # maximum while testing. 
+        # Non-DEBUG
+        # We don't append the 0's to the final array of there were no peaks
+        # detected. We only want information directly around the any foung
+        # peaks in a given frame.
+        if len(maxtab) > 0:
+        
+            # We are using relative maximum to determine if the points in 
+            # maxtab are clustered together
+            argmax = signal.argrelmax(maxtab[:,1])
+            # Scale the frequency dimension
+            maxtab[:,0] = maxtab[:,0]/t
+        
+            # Loop through each of the argmax values. 
+            # DEBUG
+            # If argmax is 0 we add a zero to the found array.
+            for i in range(0, len(argmax[0])):
+            
+                # Is there only 1 relative maximum?
+                if len(argmax[0]) == 1:
+                
+                    # Add the relative maximum to the found and final arrays
+                    found.append(maxtab[argmax[0][0],0])
+                    final.append([maxtab[argmax[0][0],0], frame, \
+                                  maxtab[argmax[0][0],1]])
+                # More than one relative maximum
+                elif len(argmax[0]) > 1:
+                
+                    # Is this the first relative maximum found?
+                    if len(found) == 0:
+                        # Add the relative maximum to the found and final
+                        # arrays
+                        found.append(maxtab[argmax[0][i],0])
+                        final.append([maxtab[argmax[0][i],0], frame, \
+                                      maxtab[argmax[0][i],1]])
+                    else:
+                        # Initialize a couple variables for determining 
+                        # whether or not the new relative max is within the 
+                        # same peak of other relative maximums
+                        num = len(found)
+                        count = 0
+                        # Look through each item in the current found array 
+                        # and see if the current maximum is too close to 
+                        # any of the currently found maxima
+                        for item in found:
+                            # Is the distance between the two points greater
+                            # than the bandwidth? We'll do more processing later
+                            if (abs(maxtab[argmax[0][i],0] - item)) > mapper:
+                                # Then add to the count
+                                count += 1
+                                # Is the current maximum greater than everyone
+                                # else already found?
+                                if count == num:
+                                    # Add the relative maximum to the found
+                                    # and final arrays
+                                    found.append(maxtab[argmax[0][i],0])
+                                    final.append([maxtab[argmax[0][i],0], \
+                                                  frame, \
+                                                  maxtab[argmax[0][i],1]])
+            # Add the 0 to found here
+            if len(argmax[0]) == 0:
+                found.append(0)
+        # Add the 0 to found here
+        else:
+            found.append(0)
+
+    return final
+
+def relative_maxima(tab):
+    """
+    Rows of a peakdet_batch table (frame, position, value) whose value is
+    above the peaks either side of it in the same frame, what argrelmax of
+    each frame's peak values gives. The first and last peak of a frame
+    never count.
+    """
+    frames = tab[:,0]
+    values = tab[:,2]
+    inner = (frames[1:-1] == frames[:-2]) & (frames[1:-1] == frames[2:]) & \
+            (values[1:-1] > values[:-2]) & (values[1:-1] > values[2:])
+    return np.flatnonzero(inner) + 1
+
+def cluster_maxima(frames, pos, mapper):
+    """
+    Which relative maxima are kept as hops. The first of each frame is,
+    and after that one is only kept if it is more than mapper away from
+    every maximum kept before it in its frame.
+
+    The maxima of a frame come in bin order, so their positions go up from 0
+    to t/2 and then up again over the wrapped around negative frequencies.
+    The closest kept maximum is then either the last one kept or the
+    lowest one kept before the wrap. That means only two positions per
+    frame need comparing, and the n'th maxima of all the frames are done
+    together, one step per maximum of the busiest frame.
+    """
+    frames = np.asarray(frames, dtype=np.int64)
+    keep = np.zeros(len(frames), dtype=bool)
+    if len(frames) == 0:
+        return keep
+
+    # Index of every maximum within its frame
+    starts = np.flatnonzero(np.r_[True, frames[1:] != frames[:-1]])
+    counts = np.diff(np.r_[starts, len(frames)])
+    rank = np.arange(len(frames)) - np.repeat(starts, counts)
+
+    # Group the maxima by rank. Within a rank they stay in frame order
+    order = np.argsort(rank, kind='stable')
+    bounds = np.r_[0, np.cumsum(np.bincount(rank))]
+
+    # Last kept and lowest kept non negative position of each frame. Nothing
+    # is ever within mapper of infinity
+    frame_ids, slot = np.unique(frames, return_inverse=True)
+    last = np.full(len(frame_ids), np.inf)
+    low = np.full(len(frame_ids), np.inf)
+
+    for k in range(len(bounds) - 1):
+        idx = order[bounds[k]:bounds[k + 1]]
+        s = slot[idx]
+        p = pos[idx]
+        ok = (abs(p - last[s]) > mapper) & (abs(p - low[s]) > mapper)
+        keep[idx] = ok
+        s = s[ok]
+        p = p[ok]
+        last[s] = p
+        first_low = (p >= 0) & (low[s] == np.inf)
+        low[s[first_low]] = p[first_low]
+
+    return keep
+
+def detect_frames(spectra, first=0, delta=.1, mapper=90, t=None, \
+                  floor=None, margin=12., center_freq=0, samp_rate=20000000):
+    """
+    Finds the hops in a block of frame magnitude spectra. first is the index
+    of the first row in the capture, counting from 0. Returns a detection
+    array, frames counted from 1 like files.py prints them and frequencies
+    in Hz for a capture at center_freq (MHz).
+
+    Gives exactly what detect_frames_loop does (once through from_final),
+    with the peaks, relative maxima and clustering of every frame in the
+    block done together.
+
+    With floor (a noise.NoiseFloor, fed every block in turn) only the peaks
+    margin dB above the noise floor of their bin are clustered.
+    """
+    if t is None:
+        t = spectra.shape[1]
+
+    # Use converted MATLAB function to detect the peaks of every fft in
+    # the block in one go
+    tab = peakdet_batch(spectra, delta)[0]
+    if floor is not None:
+        floors, index = floor.update(spectra)
+        tab = cfar_gate(tab, floors, index, margin, t)
+    return cluster_peaks(tab, first, mapper, t, center_freq, samp_rate)
+
+def cluster_peaks(tab, first=0, mapper=90, t=1000, center_freq=0, \
+                  samp_rate=20000000):
+    """
+    The hops detect_frames finds, from the peakdet_batch maxtab of a block
+    of frames, as a detection array.
+    """
+    # Relative maxima of the peaks are the candidate hops, with the
+    # frequency dimension scaled
+    tab = tab[relative_maxima(tab)]
+    pos = tab[:,1]/t
+
+    keep = cluster_maxima(tab[:,0], pos, mapper)
+    frames = tab[keep,0].astype(np.int64) + first + 1
+
+    return from_positions(pos[keep], frames, tab[keep,2], center_freq, \
+                          samp_rate)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+"""
+from array import array
+import numpy as np
+
+# One row per detected hop. capture is the center frequency (MHz) of the
+# file it was found in.
+detection_dtype = np.dtype([('frame', np.int64),
+                            ('freq_hz', np.int64),
+                            ('magnitude', np.float32),
+                            ('capture', np.int16)])
+
+def make_detections(frames, freq_hz, magnitude=0, capture=0):
+    """
+    Builds a detection array out of columns. Scalars are repeated.
+    """
+    frames = np.asarray(frames)
+    records = np.empty(len(frames), dtype=detection_dtype)
+    records['frame'] = frames
+    records['freq_hz'] = freq_hz
+    records['magnitude'] = magnitude
+    records['capture'] = capture
+    return records
+
+def from_positions(pos, frames, magnitude, center_freq=0, \
+                   samp_rate=20000000):
+    """
+    Builds a detection array out of what the detection finds: frequencies
+    as a fraction of the sample rate, relative to the capture's center
+    frequency (MHz).
+    """
+    freq_hz = np.rint(np.asarray(pos, dtype=np.float64)*samp_rate) \
+                .astype(np.int64) + int(center_freq)*1000000
+    return make_detections(frames, freq_hz, magnitude, int(center_freq))
+
+def from_final(final, center_freq, samp_rate=20000000):
+    """
+    Converts the [frequency, frame, magnitude] lists files.py used to build
+    (detect_frames_loop still does), with the frequency as a fraction of
+    the sample rate, into a detection array with absolute frequencies.
+    """
+    final = np.asarray(final, dtype=np.float64).reshape(-1, 3)
+    return from_positions(final[:,0], final[:,1].astype(np.int64), \
+                          final[:,2], center_freq, samp_rate)
+
+class Detections:
+    """
+    A detection array that can be grown, for collecting the hops of a run
+    as they are found. The records live in one buffer that doubles when it
+    fills up, so appending is amortized constant time like a list, but a
+    detection takes detection_dtype.itemsize (22) bytes rather than the
+    couple of hundred of a list of Python numbers.
+
+    Indexing, slicing and masks work on the filled part like on any
+    detection array. sort and filter work in place.
+    """
+    def __init__(self, records=None, capacity=1024):
+        self._data = np.empty(capacity, dtype=detection_dtype)
+        self._n = 0
+        if records is not None:
+            self.extend(records)
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, key):
+        return self.records[key]
+
+    @property
+    def records(self):
+        """
+        The detections as an array. A view, so it changes with the buffer.
+        """
+        return self._data[:self._n]
+
+    @property
+    def nbytes(self):
+        return self._data.nbytes
+
+    def reserve(self, n):
+        """
+        Makes room for n more detections.
+        """
+        if self._n + n > len(self._data):
+            grown = np.empty(max(2*len(self._data), self._n + n), \
+                             dtype=detection_dtype)
+            grown[:self._n] = self.records
+            self._data = grown
+
+    def append(self, frame, freq_hz, magnitude=0, capture=0):
+        self.reserve(1)
+        self._data[self._n] = (frame, freq_hz, magnitude, capture)
+        self._n += 1
+
+    def extend(self, records):
+        """
+        Appends a detection array (or another Detections).
+        """
+        if isinstance(records, Detections):
+            records = records.records
+        self.reserve(len(records))
+        self._data[self._n:self._n + len(records)] = records
+        self._n += len(records)
+
+    def sort(self, order=('frame', 'freq_hz')):
+        """
+        Sorts by the fields in order, the first one first. Stable, so equal
+        detections stay in the order they were found.
+        """
+        records = self.records
+        keys = [records[name] for name in reversed(order)]
+        records[:] = records[np.lexsort(keys)]
+        return self
+
+    def filter(self, keep):
+        """
+        Keeps the detections where the mask keep is set.
+        """
+        kept = self.records[keep]
+        self._data[:len(kept)] = kept
+        self._n = len(kept)
+        return self
+
+    def to_array(self):
+        """
+        A copy of the detections sized to fit, to keep or save.
+        """
+        return self.records.copy()
+
+def save_detections(path, records):
+    """
+    Saves detections as a .npy file. Loading it back is a single read.
+    """
+    np.save(path, np.asarray(records, dtype=detection_dtype))
+
+def load_detections(path, mhz=False):
+    """
+    Loads detections saved with save_detections, or the 'frame  frequency'
+    text files.py and post-proc.py used to write. mhz says the text has the
+    frequencies in MHz, like the _processed files.
+    """
+    if str(path).endswith('.npy'):
+        return np.load(path)
+    return read_text(path, mhz=mhz)
+
+def write_text(f, records, mhz=False):
+    """
+    Writes detections to an open text file as 'frame  frequency' lines, the
+    frequency in Hz like files.py prints or in whole MHz like the
+    _processed files. Returns the number of characters written.
+    """
+    if mhz:
+        freqs = np.round(records['freq_hz']/1000000).astype(np.int64)
+    else:
+        freqs = records['freq_hz'].astype(np.float64)
+    lines = [str(frame) + '  ' + str(freq) + '\n' \
+             for frame, freq in zip(records['frame'].tolist(), freqs.tolist())]
+    f.writelines(lines)
+    return sum(map(len, lines))
+
+def read_text(path, capture=0, mhz=False):
+    """
+    Reads 'frame  frequency' lines back in, skipping anything else (like the
+    file headers files.py prints). The frequencies are in Hz, or in MHz with
+    mhz like write_text writes them.
+    """
+    # Plain 8 byte columns while the count isn't known
+    frames = array('q')
+    freqs = array('d')
+    with open(path, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) != 2 or not parts[0].isdigit():
+                continue
+            try:
+                freq = float(parts[1])
+            except ValueError:
+                continue
+            frames.append(int(parts[0]))
+            freqs.append(freq)
+
+    freqs = np.frombuffer(freqs, dtype=np.float64).copy()
+    if mhz:
+        freqs *= 1000000
+    return make_detections(np.frombuffer(frames, dtype=np.int64), \
+                           np.rint(freqs), capture=capture)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+
+Merges the detections of all the captures (2415, 2420 ... 2485 MHz) into one
+timeline of absolute frequency against frame.
+
+Neighbouring captures are 5 MHz apart and 20 MHz wide, so most hops are seen
+by several of them. After each capture is cleaned up (repeats dropped and
+the correction rules applied, see cleanup.py and corrections.json) the
+detections are lined up in time with the capture's frame offset and the
+copies of a hop found in different captures are merged into one, keeping
+the copy from the capture whose center is closest to the hop.
+
+The copies are found with an interval index: the detections sorted by frame
+and, for each one, the index of the first detection more than max_frames
+after it. Only detections inside that window are compared, a vectorized pass
+per distance in the window, so the work grows with the number of detections
+times how many fall in one window rather than with the square of the number
+of detections.
+"""
+import json
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from cleanup import clean_detections
+from detections import detection_dtype
+
+def load_offsets(path):
+    """
+    Reads the frame offsets of the captures from the "offsets" object of a
+    rules file (see corrections.json), "MHz" : frames. Missing captures
+    have no offset.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        return {}
+    return {int(mhz) : int(frames) \
+            for mhz, frames in data.get('offsets', {}).items()}
+
+def align(detections, offsets):
+    """
+    Moves each capture's detections by its offset (frames, keyed by capture
+    MHz) onto the common timeline.
+    """
+    detections = detections.copy()
+    for capture, offset in (offsets or {}).items():
+        detections['frame'][detections['capture'] == capture] += offset
+    return detections
+
+def overlap_pairs(frames, freqs, captures, max_frames=100, min_shift=900000):
+    """
+    Every pair of detections from different captures that are at most
+    max_frames apart in time and min_shift Hz apart in frequency. Returns
+    two index arrays.
+    """
+    order = np.argsort(frames, kind='stable')
+    frames = np.asarray(frames)[order]
+    freqs = np.asarray(freqs)[order]
+    captures = np.asarray(captures)[order]
+
+    # Detection i is compared with i + 1 up to (not including) ends[i]
+    ends = np.searchsorted(frames, frames + max_frames, side='right')
+    active = np.flatnonzero(ends - np.arange(len(frames)) > 1)
+
+    first = []
+    second = []
+    k = 1
+    while len(active) > 0:
+        other = active + k
+        same = (captures[active] != captures[other]) & \
+               (np.abs(freqs[active] - freqs[other]) <= min_shift)
+        first.append(order[active[same]])
+        second.append(order[other[same]])
+        k += 1
+        active = active[ends[active] > active + k]
+
+    if not first:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    return np.concatenate(first), np.concatenate(second)
+
+def merge_overlaps(detections, max_frames=100, min_shift=900000):
+    """
+    Merges the copies of a hop seen by different captures. Detections linked
+    by overlap_pairs, directly or through others, are one hop, and the copy
+    from the capture whose center is closest to its frequency is kept (the
+    strongest one if that is a tie). Returns the kept detections sorted by
+    frame and frequency.
+    """
+    n = len(detections)
+    if n == 0:
+        return detections.copy()
+    a, b = overlap_pairs(detections['frame'], detections['freq_hz'], \
+                         detections['capture'], max_frames, min_shift)
+    graph = coo_matrix((np.ones(len(a), dtype=np.int8), (a, b)), \
+                       shape=(n, n))
+    count, hop = connected_components(graph, directed=False)
+
+    offset = np.abs(detections['freq_hz'] - \
+                    detections['capture'].astype(np.int64)*1000000)
+    order = np.lexsort((-detections['magnitude'], offset, hop))
+    best = order[np.r_[True, hop[order][1:] != hop[order][:-1]]]
+
+    merged = detections[best]
+    return merged[np.lexsort((merged['freq_hz'], merged['frame']))]
+
+def merge_timeline(captures, rules=None, offsets=None, max_gap=700, \
+                   min_shift=900000, max_frames=100):
+    """
+    Merges a list of detection arrays, one per capture (their capture field
+    set to its center MHz), into one timeline. Each is cleaned up with
+    clean_detections and the rules, moved by its offset and then the copies
+    of a hop in overlapping captures are merged with merge_overlaps. Every
+    rule sees every capture, so rules meant for one capture need its
+    capture key (like the ones in corrections.json).
+    """
+    cleaned = [clean_detections(detections, max_gap, min_shift, rules) \
+               for detections in captures]
+    if not cleaned:
+        return np.empty(0, dtype=detection_dtype)
+    detections = align(np.concatenate(cleaned), offsets)
+    return merge_overlaps(detections, max_frames, min_shift)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+
+Timers and counters for finding out where a run spends its time.
+
+    metrics = Metrics()
+    for first, block in metrics.timed(iter_blocks(path, t), 'read'):
+        with metrics.stage('fft'):
+            spectra = frame_spectra(block, t)
+        metrics.count('frames', len(spectra))
+        metrics.tick()
+    metrics.write('-')
+
+A disabled Metrics hands out a shared do nothing timer and returns
+iterables untouched, so leaving the calls in the hot loop costs a method
+call per block.
+"""
+import json
+import sys
+import time
+from contextlib import nullcontext
+
+# What stage() gives out when disabled
+_off = nullcontext()
+
+class _Timer:
+    """
+    Adds the time spent inside a with block to a stage.
+    """
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        metrics = self.metrics
+        metrics.times[self.name] = metrics.times.get(self.name, 0.) + \
+                                   time.perf_counter() - self.start
+        metrics.calls[self.name] = metrics.calls.get(self.name, 0) + 1
+        return False
+
+class Metrics:
+    """
+    Time spent per stage and counts of things (frames, samples, bytes read
+    and written, ...) for a run or part of one.
+
+    progress (seconds) makes tick() print the summary to stderr that often,
+    labelled with label. Metrics pickle, so worker processes can send theirs
+    back to be merged.
+    """
+    def __init__(self, enabled=True, progress=None, label=None):
+        self.enabled = enabled
+        self.progress = progress
+        self.label = label
+        self.times = {}
+        self.calls = {}
+        self.counts = {}
+        self.start = time.time()
+        self.last = self.start
+
+    def stage(self, name):
+        """
+        Context manager timing a stage.
+        """
+        if not self.enabled:
+            return _off
+        return _Timer(self, name)
+
+    def timed(self, iterable, name):
+        """
+        Wraps an iterable (a reader, say) so the time spent getting each item
+        out of it goes to stage name.
+        """
+        if not self.enabled:
+            return iterable
+        return self._timed(iter(iterable), name)
+
+    def _timed(self, iterator, name):
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def merge(self, other):
+        """
+        Adds the times and counts of other in.
+        """
+        for name, seconds in other.times.items():
+            self.times[name] = self.times.get(name, 0.) + seconds
+        for name, calls in other.calls.items():
+            self.calls[name] = self.calls.get(name, 0) + calls
+        for name, n in other.counts.items():
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def summary(self):
+        """
+        Everything as a dict ready for JSON. Stage times are summed over
+        worker processes, so they can add up to more than elapsed.
+        """
+        elapsed = time.time() - self.start
+        summary = {}
+        if self.label is not None:
+            summary['label'] = self.label
+        summary['elapsed'] = round(elapsed, 6)
+        summary['stages'] = {name : {'seconds' : round(seconds, 6),
+                                     'calls'   : self.calls[name]}
+                             for name, seconds in self.times.items()}
+        summary['counts'] = dict(self.counts)
+        if 'samples' in self.counts and elapsed > 0:
+            summary['samples_per_s'] = round(self.counts['samples']/elapsed)
+        return summary
+
+    def tick(self):
+        """
+        Call once per block. Prints progress if it is due.
+        """
+        if self.progress is None or not self.enabled:
+            return
+        now = time.time()
+        if now - self.last >= self.progress:
+            self.last = now
+            print(json.dumps(self.summary()), file=sys.stderr, flush=True)
+
+    def write(self, dest):
+        """
+        Writes the summary as JSON to the file dest, or stderr for '-'.
+        """
+        if not self.enabled:
+            return
+        if dest == '-':
+            print(json.dumps(self.summary(), indent=1), file=sys.stderr)
+            return
+        with open(dest, 'w') as f:
+            json.dump(self.summary(), f, indent=1)
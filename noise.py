@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+
+Adaptive noise floor for the frame spectra, and a CFAR style gate that
+throws away the peaks that don't stand far enough above it.
+
+peakdet only looks at how far a peak stands above its neighbours (delta),
+in absolute magnitude. When the HackRF gain changes so does everything in
+the spectrum, and a fixed delta either lets the noise through as peaks or
+misses the hops. The floor follows the gain: it is estimated per frequency
+bin from the frames just before, so a peak has to be margin dB above what
+that bin normally holds to count.
+
+The frames are taken chunk frames at a time. Each chunk is summed up by a
+percentile of every bin over its frames, and the floor for the frames of a
+chunk is the median of the summaries of the history chunks before it. A
+hop stays on one frequency for a few hundred frames and the bins it covers
+are quiet most of the time, so neither statistic sees it. Counting chunks
+from the first frame handed in (and not the block sizes) means the floor
+comes out the same however the frames are split into blocks, as long as
+the first block holds a whole chunk.
+"""
+import numpy as np
+
+class NoiseFloor:
+    """
+    Running noise floor estimate, fed a block of frame spectra at a time.
+    The floor of a frame only depends on the chunks before its own, except
+    in the very first chunk where there are none and the chunk itself is
+    used.
+    """
+    def __init__(self, chunk=256, history=8, percentile=50.):
+        self.chunk = chunk
+        self.history = history
+        self.percentile = percentile
+        # Summaries of the last history complete chunks and the frames of
+        # the chunk in progress
+        self.summaries = None
+        self.partial = None
+
+    def _summary(self, rows):
+        return np.percentile(rows, self.percentile, axis=0)
+
+    def update(self, spectra):
+        """
+        Adds a (frames x bins) block of spectra. Returns (floors, index), the
+        floor of row i of the block being floors[index[i]].
+        """
+        spectra = np.asarray(spectra)
+        n, bins = spectra.shape
+        if self.partial is None:
+            self.summaries = np.empty((0, bins))
+            self.partial = np.empty((0, bins), dtype=spectra.dtype)
+
+        offset = len(self.partial)
+        index = (offset + np.arange(n))//self.chunk
+        chunks = (offset + n - 1)//self.chunk + 1 if n else 0
+        floors = np.empty((chunks, bins))
+
+        # Summary of every chunk the block completes, one array operation
+        # for all the whole chunks inside the block
+        head = min(n, self.chunk - offset)
+        summaries = []
+        if offset + head == self.chunk:
+            summaries.append(self._summary(np.concatenate((self.partial, \
+                                                           spectra[:head]))))
+            whole = (n - head)//self.chunk
+            if whole:
+                summaries.extend(np.percentile( \
+                    spectra[head:head + whole*self.chunk] \
+                        .reshape(whole, self.chunk, bins), \
+                    self.percentile, axis=1))
+        known = np.concatenate((self.summaries, \
+                                np.reshape(summaries, (-1, bins))))
+
+        before = len(self.summaries)
+        for c in range(chunks):
+            if before + c == 0:
+                # Nothing before the first chunk, use what there is of it
+                floors[c] = self._summary(np.concatenate((self.partial, \
+                                                          spectra[:head])))
+            else:
+                floors[c] = np.median(known[max(0, before + c - \
+                                                   self.history): \
+                                            before + c], axis=0)
+
+        self.summaries = known[-self.history:]
+        if offset + n < self.chunk:
+            self.partial = np.concatenate((self.partial, spectra))
+        else:
+            self.partial = spectra[n - (offset + n) % self.chunk:].copy()
+        return floors, index
+
+def cfar_gate(tab, floors, index, margin=12., t=None):
+    """
+    Keeps the rows of a peakdet_batch maxtab (row, position, value) whose
+    value is margin dB above the noise floor of their bin, floors and index
+    being what NoiseFloor.update returned for the same block. The spectra
+    are magnitudes, so margin is 20*log10 of the ratio. A bin holding only
+    noise is 12 dB over its median about once in 60000 frames.
+    """
+    if len(tab) == 0:
+        return tab
+    if t is None:
+        t = floors.shape[1]
+    rows = tab[:,0].astype(np.int64)
+    # Positions past t/2 were wrapped around to negative ones
+    bins = tab[:,1].astype(np.int64) % t
+    return tab[tab[:,2] > floors[index[rows], bins]*10**(margin/20)]
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+"""
+from collections import namedtuple
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# A repeating run of hops. symbols is the tuple of frequencies, positions the
+# index of every occurrence in the sequence and gaps the mean number of
+# frames between each pair of neighbouring hops in it.
+Pattern = namedtuple('Pattern', ['symbols', 'count', 'positions', 'gaps'])
+
+def ngram_ids(codes, n, ids=None):
+    """
+    Gives every window of n codes an integer id, equal windows getting equal
+    ids. Windows are built up one symbol at a time (window id * number of
+    symbols + next symbol) and renumbered after each step so the ids never
+    overflow, whatever n is. Pass the ids of the windows of n - 1 codes to
+    only do the last step.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    n_symbols = int(codes.max()) + 1 if len(codes) else 1
+    if ids is None:
+        ids = codes
+        start = 1
+    else:
+        start = n - 1
+    for k in range(start, n):
+        ids = np.unique(ids[:-1]*n_symbols + codes[k:], return_inverse=True)[1]
+        ids = ids.reshape(-1)
+    return ids
+
+def mine_patterns(symbols, frames=None, sizes=range(2, 4), top=None, \
+                  exclude=()):
+    """
+    Counts every run of hops of each length in sizes in a single pass per
+    length. Returns a dict of size -> list of Patterns, the most frequent
+    first (ties go to the one that shows up first), cut to the top most
+    frequent if top is given. Patterns in exclude are left out.
+    """
+    symbols = np.asarray(symbols)
+    if frames is None:
+        frames = np.arange(len(symbols))
+    frames = np.asarray(frames, dtype=np.int64)
+
+    if len(symbols) == 0:
+        return {n : [] for n in sizes}
+    uniques, codes = np.unique(symbols, return_inverse=True)
+    codes = codes.reshape(-1)
+    steps = np.diff(frames)
+
+    # Window ids of each size are built from the ones a size smaller
+    all_ids = {1 : codes}
+    for n in range(2, min(max(sizes), len(codes)) + 1):
+        all_ids[n] = ngram_ids(codes, n, all_ids[n - 1])
+
+    found = {}
+    for n in sizes:
+        if n < 1 or n > len(codes):
+            found[n] = []
+            continue
+
+        ids = all_ids[n]
+        windows = sliding_window_view(codes, n)
+
+        # Knock out the windows we were told to ignore
+        where = np.arange(len(ids))
+        for pattern in exclude:
+            if len(pattern) != n or not np.isin(pattern, uniques).all():
+                continue
+            match = (windows[where] == np.searchsorted(uniques, pattern)).all(1)
+            where = where[~match]
+        ids = ids[where]
+        if len(ids) == 0:
+            found[n] = []
+            continue
+
+        # How often each pattern shows up, and where it first does
+        counts = np.bincount(ids)
+        present = np.flatnonzero(counts)
+        first = np.full(len(counts), len(codes))
+        np.minimum.at(first, ids, where)
+
+        # Most frequent first, earliest first on ties. Every pattern starts
+        # at a different place so this key never ties, and only the top few
+        # need sorting when that's all that was asked for
+        key = (counts.max() - counts[present])*(len(codes) + 1) + \
+              first[present]
+        if top is not None and top < len(key):
+            present = present[np.argpartition(key, top)[:top]]
+            key = (counts.max() - counts[present])*(len(codes) + 1) + \
+                  first[present]
+        ranked = present[np.argsort(key)]
+
+        # Frames between neighbouring hops of every window, summed per
+        # pattern for the means
+        sums = np.zeros((len(counts), n - 1))
+        if n > 1:
+            gaps = sliding_window_view(steps, n - 1)[where]
+            for k in range(n - 1):
+                sums[:,k] = np.bincount(ids, weights=gaps[:,k], \
+                                        minlength=len(counts))
+
+        # Positions of every pattern. With just a few patterns wanted it is
+        # quicker to look for each of them than to sort all the windows
+        if top is not None:
+            positions = [where[ids == p] for p in ranked]
+        else:
+            order = np.argsort(ids, kind='stable')
+            starts = np.concatenate(([0], np.cumsum(counts)))
+            positions = [where[order[starts[p]:starts[p + 1]]] for p in ranked]
+
+        found[n] = [Pattern(tuple(uniques[windows[first[p]]].tolist()), \
+                            int(counts[p]), pos, sums[p]/counts[p]) \
+                    for p, pos in zip(ranked, positions)]
+
+    return found
+
+# What analyze_sequence finds. pattern is the Pattern that repeats every
+# period hops, score the fraction of hops that come back period hops later
+# and gap_vars the variance of the frames between each pair of neighbouring
+# hops in the pattern. spacing and spacing_var are the mean and variance of
+# the frames between any two hops in a row.
+Period = namedtuple('Period', ['period', 'score', 'pattern', 'gap_vars', \
+                               'spacing', 'spacing_var'])
+
+def period_scores(codes, max_period):
+    """
+    Autocorrelation of a symbol sequence: for every lag up to max_period
+    the fraction of symbols that show up again lag places later. Index 0 is
+    lag 0.
+    """
+    codes = np.asarray(codes)
+    scores = np.zeros(max_period + 1)
+    for lag in range(min(max_period, len(codes) - 1) + 1):
+        scores[lag] = np.count_nonzero(codes[:len(codes) - lag] == \
+                                       codes[lag:])/(len(codes) - lag)
+    return scores
+
+def analyze_sequence(symbols, frames=None, max_period=64, min_period=2, \
+                     tolerance=.9):
+    """
+    Finds the pattern a hop sequence repeats and how the hops are spaced.
+
+    The period is the shortest lag (of at least min_period hops) whose
+    autocorrelation is within tolerance of the best one, so that multiples
+    of the period don't win. The pattern is then the most frequent run of
+    that many hops, not counting runs of a single frequency over and over.
+    Returns a Period, or None if the sequence is too short.
+    """
+    symbols = np.asarray(symbols)
+    if frames is None:
+        frames = np.arange(len(symbols))
+    frames = np.asarray(frames, dtype=np.int64)
+
+    max_period = min(max_period, len(symbols)//2)
+    if max_period < min_period:
+        return None
+
+    uniques, codes = np.unique(symbols, return_inverse=True)
+    codes = codes.reshape(-1)
+
+    scores = period_scores(codes, max_period)
+    best = scores[min_period:].max()
+    period = min_period + int(np.flatnonzero(scores[min_period:] >= \
+                                             best*tolerance)[0])
+
+    # The same frequency over and over is the hop being seen twice, not a
+    # pattern
+    repeats = [(u,)*period for u in uniques.tolist()]
+    found = mine_patterns(symbols, frames, [period], 1, repeats)[period]
+    if not found:
+        return None
+    pattern = found[0]
+
+    steps = np.diff(frames)
+    gaps = sliding_window_view(steps, period - 1)[pattern.positions]
+
+    return Period(period, float(scores[period]), pattern, gaps.var(axis=0), \
+                  float(steps.mean()), float(steps.var()))
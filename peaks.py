@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+"""
+import sys
+import numpy as np
+
+# Converted MATLAB function taken from Github. Kept as the reference the
+# vectorized versions below are checked against (see bench.py)
+def peakdet_loop(v, delta, x = None, t = None):
+    """
+    Converted from MATLAB script at http://billauer.co.il/peakdet.html
+
+    Returns two arrays
+
+    function [maxtab, mintab]=peakdet(v, delta, x)
+    %PEAKDET Detect peaks in a vector
+    %        [MAXTAB, MINTAB] = PEAKDET(V, DELTA) finds the local
+    %        maxima and minima ("peaks") in the vector V.
+    %        MAXTAB and MINTAB consists of two columns. Column 1
+    %        contains indices in V, and column 2 the found values.
+    %
+    %        With [MAXTAB, MINTAB] = PEAKDET(V, DELTA, X) the indices
+    %        in MAXTAB and MINTAB are replaced with the corresponding
+    %        X-values.
+    %
+    %        A point is considered a maximum peak if it has the maximal
+    %        value, and was preceded (to the left) by a value lower by
+    %        DELTA.
+
+    % Eli Billauer, 3.4.05 (Explicitly not copyrighted).
+    % This function is released to the public domain; Any use is allowed.
+
+    """
+    maxtab = []
+    mintab = []
+
+    if x is None:
+        x = np.arange(len(v))
+
+    v = np.asarray(v)
+
+    # Maximum positions past the middle of the frame are wrapped around to
+    # negative frequencies
+    if t is None:
+        t = len(v)
+
+    if len(v) != len(x):
+        sys.exit('Input vectors v and x must have same length')
+
+    if not np.isscalar(delta):
+        sys.exit('Input argument delta must be a scalar')
+
+    if delta <= 0:
+        sys.exit('Input argument delta must be positive')
+
+    mn, mx = np.inf, -np.inf
+    mnpos, mxpos = np.nan, np.nan
+
+    lookformax = True
+
+    for i in np.arange(len(v)):
+        this = v[i]
+        if this > mx:
+            mx = this
+            mxpos = x[i]
+        if this < mn:
+            mn = this
+            mnpos = x[i]
+
+        if lookformax:
+            if this < mx-delta:
+                if mxpos > t/2:
+                    mxpos -= t
+                maxtab.append((mxpos, mx))
+                mn = this
+                mnpos = x[i]
+                lookformax = False
+        else:
+            if this > mn+delta:
+                mintab.append((mnpos, mn))
+                mx = this
+                mxpos = x[i]
+                lookformax = True
+
+    return np.array(maxtab), np.array(mintab)
+
+def peakdet(v, delta, x = None, t = None):
+    """
+    Same results as peakdet_loop, but instead of stepping through v one
+    value at a time each maximum (or minimum) is found with a running
+    max (min) over the stretch of v following the last turning point.
+    Only the number of peaks costs Python iterations.
+    """
+    maxtab = []
+    mintab = []
+
+    if x is None:
+        x = np.arange(len(v))
+
+    v = np.asarray(v)
+
+    if t is None:
+        t = len(v)
+
+    if len(v) != len(x):
+        sys.exit('Input vectors v and x must have same length')
+
+    if not np.isscalar(delta):
+        sys.exit('Input argument delta must be a scalar')
+
+    if delta <= 0:
+        sys.exit('Input argument delta must be positive')
+
+    n = len(v)
+    i = 0
+    step = 64
+    lookformax = True
+
+    while i < n:
+        # Look at a growing window past i until the running max (min) has
+        # been left behind by more than delta
+        width = step
+        while True:
+            seg = v[i:i+width]
+            if lookformax:
+                hit = np.flatnonzero(seg < np.maximum.accumulate(seg) - delta)
+            else:
+                hit = np.flatnonzero(seg > np.minimum.accumulate(seg) + delta)
+            if len(hit) > 0 or i + width >= n:
+                break
+            width *= 2
+
+        # Ran off the end of the vector without another turning point
+        if len(hit) == 0:
+            break
+
+        # The turning point can never be the first value of the window, so
+        # the extreme value is somewhere before it. argmax/argmin give the
+        # first occurrence, just like the strict comparisons in the loop.
+        k = hit[0]
+        if lookformax:
+            p = i + np.argmax(seg[:k])
+            mxpos = x[p]
+            if mxpos > t/2:
+                mxpos -= t
+            maxtab.append((mxpos, v[p]))
+        else:
+            p = i + np.argmin(seg[:k])
+            mintab.append((x[p], v[p]))
+
+        # The search for the opposite peak starts at the turning point
+        i += k
+        lookformax = not lookformax
+        step = max(16, 2*k)
+
+    return np.array(maxtab), np.array(mintab)
+
+def peakdet_batch(spectra, delta, t = None):
+    """
+    peakdet for every row of a 2-D array of frame spectra at once. The
+    state machine of the loop version is run for all frames together, one
+    bin at a time.
+
+    Returns maxtab and mintab with three columns: the row (frame) the peak
+    came from, its position and its value. Rows are sorted by frame and
+    within a frame are in the order peakdet would return them.
+    """
+    spectra = np.asarray(spectra)
+
+    if spectra.ndim != 2:
+        sys.exit('Input spectra must be 2-D')
+
+    if not np.isscalar(delta):
+        sys.exit('Input argument delta must be a scalar')
+
+    if delta <= 0:
+        sys.exit('Input argument delta must be positive')
+
+    n_frames, n = spectra.shape
+    if t is None:
+        t = n
+
+    # Walk the bins in memory order
+    bins = np.ascontiguousarray(spectra.T)
+
+    mn = np.full(n_frames, np.inf, dtype=bins.dtype)
+    mx = np.full(n_frames, -np.inf, dtype=bins.dtype)
+    mnpos = np.zeros(n_frames, dtype=np.int64)
+    mxpos = np.zeros(n_frames, dtype=np.int64)
+    lookformax = np.ones(n_frames, dtype=bool)
+
+    maxtab = []
+    mintab = []
+
+    for i in range(n):
+        this = bins[i]
+
+        up = this > mx
+        np.copyto(mx, this, where=up)
+        np.copyto(mxpos, i, where=up)
+        down = this < mn
+        np.copyto(mn, this, where=down)
+        np.copyto(mnpos, i, where=down)
+
+        # Frames that found a maximum and frames that found a minimum
+        got_max = np.flatnonzero(lookformax & (this < mx - delta))
+        got_min = np.flatnonzero(~lookformax & (this > mn + delta))
+
+        if len(got_max) > 0:
+            maxtab.append((got_max, mxpos[got_max], mx[got_max]))
+            mn[got_max] = this[got_max]
+            mnpos[got_max] = i
+            lookformax[got_max] = False
+        if len(got_min) > 0:
+            mintab.append((got_min, mnpos[got_min], mn[got_min]))
+            mx[got_min] = this[got_min]
+            mxpos[got_min] = i
+            lookformax[got_min] = True
+
+    maxtab = _stack(maxtab)
+    mintab = _stack(mintab)
+
+    # Same wrap around of the maximum positions as peakdet
+    pos = maxtab[:,1]
+    pos[pos > t/2] -= t
+
+    return maxtab, mintab
+
+# Join the per bin peaks and order them by frame
+def _stack(found):
+    if not found:
+        return np.empty((0, 3))
+    frames, pos, val = (np.concatenate(c) for c in zip(*found))
+    tab = np.column_stack((frames, pos, val))
+    # Peaks were found in bin order, a stable sort keeps that within a frame
+    return tab[np.argsort(frames, kind='stable')]
+
+def split_frames(tab, n_frames):
+    """
+    Splits a peakdet_batch table into a list with the (position, value)
+    peaks of each of the n_frames frames.
+    """
+    bounds = np.searchsorted(tab[:,0], np.arange(1, n_frames))
+    return np.split(tab[:,1:], bounds)
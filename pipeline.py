@@ -0,0 +1,696 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+
+The whole processing chain as functions that take their settings as a
+Config, so it can be run from other code as well as from the command line.
+
+    python pipeline.py detect 2460 2465 [options]   # what files.py does
+    python pipeline.py post-proc 2475 [options]     # what post-proc.py does
+    python pipeline.py sequence [signals] [options] # what sequence.py does
+    python pipeline.py merge 2415 2420 [options]    # one timeline of all
+    python pipeline.py status <checkpoint dir>      # checkpointed runs
+    python pipeline.py sweep 2460 --grid ...        # tuning, see sweep.py
+
+files.py, post-proc.py and sequence.py are thin scripts on top of this with
+the settings at the top of them. Only what a command needs gets imported:
+the fft and peak detection code for detect, joblib for more than one job,
+matplotlib only when frames are drawn.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from collections import namedtuple
+import numpy as np
+from detections import Detections, load_detections, save_detections, \
+                       write_text
+from cleanup import clean_detections, load_rules
+from patterns import analyze_sequence
+from metrics import Metrics
+
+# Every setting of the chain with its default. See files.py, post-proc.py
+# and sequence.py for what they do.
+_settings = [
+    # Capture and frames
+    ('samp_rate', 20000000),
+    ('t', 1000),
+    ('bw', 1800000),
+    ('delta', .1),
+    ('overlap', 0),
+    ('window', None),
+    ('start_frame', 0),
+    ('stop_frame', None),
+    ('data_dir', '.'),
+    # Noise floor gate on the peaks
+    ('cfar_margin', None),
+    ('floor_chunk', 256),
+    ('floor_history', 8),
+    ('floor_percentile', 50.),
+    # Polyphase channelizer front end
+    ('front_end', 'fft'),
+    ('n_channels', None),
+    ('channel_taps', 8),
+    ('energy_threshold', 6.),
+    # Spectrum cache
+    ('cache_dir', None),
+    ('cache_budget', 20*2**30),
+    ('cache_dtype', 'float32'),
+    # Workers, images and output
+    ('n_jobs', 1),
+    ('min_job_frames', 50000),
+    ('checkpoint_dir', None),
+    ('checkpoint_frames', 50000),
+    ('plot_mode', 'off'),
+    ('plot_every', 100),
+    ('plot_top', None),
+    ('plot_workers', 2),
+    ('output_format', 'npy'),
+    ('metrics_file', None),
+    ('progress_every', None),
+    ('debug', 0),
+    # Post processing
+    ('max_gap', 700),
+    ('min_shift', 900000),
+    ('corrections', None),
+    ('export_text', True),
+    # Merging the captures
+    ('offsets', None),
+    ('merge_frames', 100),
+    # Sequence analysis
+    ('max_period', 64),
+    ]
+
+class Config(namedtuple('Config', [name for name, default in _settings], \
+                        defaults=[default for name, default in _settings])):
+    """
+    Settings for a run. Anything not given keeps its default, use
+    _replace() to change some of them.
+    """
+    __slots__ = ()
+
+    @property
+    def mapper(self):
+        """
+        Channel bandwidth in fft bins.
+        """
+        return (self.bw*self.t)/self.samp_rate
+
+def capture_path(center_freq, config):
+    return os.path.join(config.data_dir, center_freq)
+
+# Process the frames from start up to stop of a file and return what was
+# found, along with the metrics of the job
+def process_frames(center_freq, start, stop, config):
+    from peaks import peakdet_batch
+    from detect import cluster_peaks
+
+    metrics = Metrics(config.metrics_file is not None or \
+                      config.progress_every is not None, \
+                      config.progress_every, \
+                      center_freq + ' ' + str(start) + '-' + str(stop))
+
+    if config.front_end == 'channelizer':
+        return channel_frames(center_freq, start, stop, config, metrics), \
+               metrics
+
+    # The detections of every block go into one growing array. Nothing is
+    # drawn here, the frames are rendered afterwards from these results
+    # (see render.py)
+    final = Detections()
+
+    # The noise floor of a frame comes from the chunks of frames before it,
+    # counted from start_frame. A job that starts part way in reads those
+    # chunks first so it gets the same floor as running the file whole
+    floor = None
+    begin = start
+    if config.cfar_margin is not None:
+        from noise import NoiseFloor, cfar_gate
+        floor = NoiseFloor(config.floor_chunk, config.floor_history, \
+                           config.floor_percentile)
+        chunks = max(0, (start - config.start_frame)//config.floor_chunk - \
+                        config.floor_history)
+        begin = config.start_frame + chunks*config.floor_chunk
+
+    # The magnitude spectra are computed a block of frames at a time
+    for first, spectra in capture_spectra(center_freq, begin, stop, config, \
+                                          metrics):
+
+        if floor is not None:
+            with metrics.stage('noise floor'):
+                floors, index = floor.update(spectra)
+            # Frames only read for the floor
+            if first < start:
+                skip = min(start - first, len(spectra))
+                spectra = spectra[skip:]
+                index = index[skip:]
+                first += skip
+                if len(spectra) == 0:
+                    continue
+
+        # Find the hops in this block of frames
+        with metrics.stage('peakdet'):
+            tab = peakdet_batch(spectra, config.delta)[0]
+        if floor is not None:
+            with metrics.stage('noise floor'):
+                peaks = len(tab)
+                tab = cfar_gate(tab, floors, index, config.cfar_margin, \
+                                config.t)
+            metrics.count('gated_peaks', peaks - len(tab))
+        with metrics.stage('clustering'):
+            found = cluster_peaks(tab, first, config.mapper, config.t, \
+                                  center_freq, config.samp_rate)
+        metrics.count('frames', len(spectra))
+        metrics.count('detections', len(found))
+        metrics.tick()
+
+        # Print the frequency of the relative maxima found
+        if config.debug:
+            for freq in found['freq_hz'].tolist():
+                print(float(freq))
+
+        final.extend(found)
+
+    return final.to_array(), metrics
+
+# Energy detection on the channels of the polyphase filter bank instead of
+# peaks in the fft of every frame. Same detection array results.
+# The frames from start up to stop are turned into the filter bank slots
+# (about a frame each) their samples hold, so splitting a file into jobs
+# gives the same slots as running it whole. Frames start every t - overlap
+# samples, like in the fft path
+def channel_frames(center_freq, start, stop, config, metrics):
+    import channelizer
+
+    n_channels = config.n_channels
+    if n_channels is None:
+        n_channels = channelizer.default_channels(config.samp_rate, config.bw)
+    h = channelizer.prototype(n_channels, config.channel_taps)
+    avg = max(1, config.t//n_channels)
+    slot = avg*n_channels
+    step = config.t - config.overlap
+
+    final = Detections()
+    for found in metrics.timed(channelizer.channel_hops( \
+                                   capture_path(center_freq, config), \
+                                   n_channels, h, avg, \
+                                   config.energy_threshold, config.t, \
+                                   config.samp_rate, start*step//slot, \
+                                   stop*step//slot, center_freq, \
+                                   config.overlap), \
+                               'channelize'):
+        metrics.count('detections', len(found))
+        metrics.tick()
+
+        if config.debug:
+            for freq in found['freq_hz'].tolist():
+                print(float(freq))
+
+        final.extend(found)
+
+    metrics.count('frames', stop - start)
+    metrics.count('samples', (stop - start)*step)
+    return final.to_array()
+
+# The spectra of the frames from start up to stop of a file, a block at a
+# time, from the cache when it is on
+def capture_spectra(center_freq, start, stop, config, metrics):
+    from spectrum import frame_spectra
+    from capture import iter_blocks
+
+    t = config.t
+    overlap = config.overlap
+    window = config.window
+    path = capture_path(center_freq, config)
+
+    if config.cache_dir is not None:
+        from cache import SpectrumCache
+        cache = SpectrumCache(config.cache_dir, config.cache_budget, \
+                              config.cache_dtype)
+        for first, spectra in metrics.timed(cache.spectra(path, t, overlap, \
+                                                          window, start, \
+                                                          stop), 'cache'):
+            metrics.count('samples', len(spectra)*(t - overlap))
+            metrics.count('bytes_read', spectra.size*cache.dtype.itemsize)
+            yield first, spectra
+        return
+
+    for first, block in metrics.timed(iter_blocks(path, t, overlap, \
+                                                  start=start, stop=stop), \
+                                      'read'):
+        metrics.count('samples', len(block))
+        metrics.count('bytes_read', block.nbytes)
+        with metrics.stage('fft'):
+            spectra = frame_spectra(block, t, overlap, window)
+        yield first, spectra
+
+# Split the frames of a file into the ranges the workers will process
+def frame_ranges(center_freq, config):
+    from capture import capture_frames
+
+    # The last frame was never processed by the original loop so we stop one
+    # short of the frames in the file
+    iters = capture_frames(capture_path(center_freq, config), config.t, \
+                           config.overlap)
+    stop = iters - 1
+    if config.stop_frame is not None:
+        stop = min(config.stop_frame, stop)
+
+    start = config.start_frame
+    frames = max(stop - start, 0)
+
+    # Checkpointed runs go in fixed ranges, so a resumed run asks for the
+    # same ranges whatever the number of jobs
+    if config.checkpoint_dir is not None:
+        bounds = list(range(start, stop, config.checkpoint_frames)) + [stop] \
+                 if frames else [start, start]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    # joblib's -1 for every CPU, -2 for all but one and so on
+    workers = config.n_jobs
+    if workers < 0:
+        from joblib import effective_n_jobs
+        workers = effective_n_jobs(workers)
+    jobs = max(1, min(workers, frames//config.min_job_frames))
+    bounds = [start + (frames*i)//jobs for i in range(jobs + 1)]
+
+    return list(zip(bounds[:-1], bounds[1:]))
+
+# Write out the detections of one file. Returns the number of bytes written
+def write_output(center_freq, detections, config):
+
+    if config.output_format is None:
+        return 0
+
+    if config.output_format == 'npy':
+        save_detections(center_freq + '.npy', detections)
+        return os.path.getsize(center_freq + '.npy')
+
+    # Print file output header
+    print('*'*80)
+    print(' '*30 + 'Output for file ' + center_freq)
+    print('*'*80 + '\n\n\n\n')
+
+    # Print each detection. The output prints the frame number and then the
+    # frequency of the relative maximum found
+    written = write_text(sys.stdout, detections)
+
+    # Add some space between files
+    print('\n\n\n')
+
+    return written
+
+# Settings the renderer needs to find a frame and redo its fft and peaks
+def plot_args(config):
+    return {'t' : config.t, 'overlap' : config.overlap, \
+            'window' : config.window, 'delta' : config.delta, \
+            'data_dir' : config.data_dir}
+
+def detect_files(file_names, config=Config()):
+    """
+    Finds the hops in every capture in file_names (center frequencies in
+    MHz, also the file names), farming frame ranges of all of them out to
+    config.n_jobs workers. Writes each file's detections out as
+    config.output_format says ('npy', 'text' or None for not at all) and
+    returns a dict of file name -> detection array.
+
+    Results come back in the order the jobs were handed out, so joining them
+    up per file puts the frames back in order. Only this process prints, so
+    output from different files can't get mixed together.
+
+    With config.checkpoint_dir every frame range's detections are saved as
+    soon as it is done (see checkpoint.py), and the ranges a previous run
+    with the same settings finished are not done again.
+    """
+    metrics = Metrics(config.metrics_file is not None)
+
+    checkpoint = None
+    if config.checkpoint_dir is not None:
+        from checkpoint import Checkpoint
+        checkpoint = Checkpoint(config.checkpoint_dir, config)
+
+    jobs = []
+    for name in file_names:
+        ranges = frame_ranges(name, config)
+        if checkpoint is not None:
+            todo = checkpoint.begin(name, capture_path(name, config), ranges)
+            metrics.count('ranges_resumed', len(ranges) - len(todo))
+            ranges = todo
+        jobs += [(name, start, stop) for start, stop in ranges]
+
+    if config.n_jobs == 1:
+        results = (process_frames(*job, config) for job in jobs)
+    else:
+        from joblib import Parallel, delayed
+        results = Parallel(n_jobs=config.n_jobs, return_as='generator')( \
+                      delayed(process_frames)(*job, config) for job in jobs)
+
+    # Rendering happens in its own processes, fed with frames as the
+    # detection results come in
+    renderer = None
+    if config.plot_mode != 'off':
+        from render import plot_frame, select_frames, RenderPool
+    if config.plot_mode == 'async':
+        renderer = RenderPool(config.plot_workers)
+
+    found = []
+    for job, (job_found, job_metrics) in zip(jobs, results):
+        metrics.merge(job_metrics)
+        if checkpoint is not None:
+            with metrics.stage('checkpoint'):
+                checkpoint.save(*job, job_found)
+        else:
+            found.append(job_found)
+        if renderer is not None:
+            with metrics.stage('render'):
+                for frame in select_frames(job_found):
+                    renderer.submit(job[0], frame, **plot_args(config))
+
+    if renderer is not None:
+        with metrics.stage('render'):
+            renderer.close()
+
+    output = {}
+    for name in file_names:
+        if checkpoint is not None:
+            output[name] = checkpoint.load(name)
+        else:
+            final = Detections(capacity=sum(len(job_found) for job, job_found \
+                                            in zip(jobs, found) \
+                                            if job[0] == name))
+            for job, job_found in zip(jobs, found):
+                if job[0] == name:
+                    final.extend(job_found)
+            output[name] = final.records
+
+        with metrics.stage('write'):
+            metrics.count('bytes_written', write_output(name, output[name], \
+                                                        config))
+
+        # Only a sample of the frames gets drawn, straight after detection
+        if config.plot_mode == 'sampled':
+            with metrics.stage('render'):
+                for frame in select_frames(output[name], config.plot_every, \
+                                           config.plot_top):
+                    plot_frame(name, frame, show=config.debug, \
+                               **plot_args(config))
+
+    metrics.write(config.metrics_file)
+    return output
+
+def post_process(detections, config=Config()):
+    """
+    Drops the repeats of the same hop and applies config.corrections, a
+    list of correction rules (see cleanup.apply_rules) or an old table of
+    frequency (MHz) -> frequency it really is (Hz) or 0 to throw it away.
+    """
+    return clean_detections(detections, config.max_gap, config.min_shift, \
+                            config.corrections)
+
+def load_file(file_num):
+    """
+    The detections files.py wrote for file_num, from the .npy file or the
+    text output otherwise.
+    """
+    if os.path.exists(file_num + '.npy'):
+        detections = load_detections(file_num + '.npy')
+    else:
+        detections = load_detections(file_num + '.txt')
+    detections['capture'] = int(file_num)
+    return detections
+
+def post_process_file(file_num, config=Config()):
+    """
+    post_process on the detections files.py wrote for file_num, the .npy
+    file or the text output otherwise. The result goes to
+    <file_num>_processed.npy and, with config.export_text, to the
+    <file_num>_processed text file.
+    """
+    output = post_process(load_file(file_num), config)
+
+    save_detections(file_num + '_processed.npy', output)
+    if config.export_text:
+        with open(file_num + '_processed', 'w') as f:
+            write_text(f, output, mhz=True)
+    return output
+
+def merge_files(file_nums, output='merged', config=Config()):
+    """
+    Merges the detections files.py wrote for every capture in file_nums into
+    one timeline (see merge.py), cleaning each up like post_process and
+    lining them up with config.offsets (frames per capture MHz). Copies of
+    a hop within config.merge_frames frames and config.min_shift Hz of each
+    other in different captures become one. The result goes to
+    <output>.npy and, with config.export_text, to the <output> text file.
+    """
+    from merge import merge_timeline
+
+    merged = merge_timeline([load_file(file_num) for file_num in file_nums], \
+                            config.corrections, config.offsets, \
+                            config.max_gap, config.min_shift, \
+                            config.merge_frames)
+
+    save_detections(output + '.npy', merged)
+    if config.export_text:
+        with open(output, 'w') as f:
+            write_text(f, merged, mhz=True)
+    return merged
+
+def sequence_files(directory='signals', config=Config()):
+    """
+    Finds the repeating pattern and the hop timing of every
+    <file>_processed.npy (or text) file in directory. Returns a dict of the
+    file's center frequency -> Period, None when it has too few hops.
+    """
+    paths = glob.glob(os.path.join(directory, '*_processed.npy'))
+    paths += [path for path in \
+              glob.glob(os.path.join(directory, '*_processed')) \
+              if path + '.npy' not in paths]
+
+    results = {}
+    for path in paths:
+        detections = load_detections(path, mhz=True)
+        mhz = np.round(detections['freq_hz']/1000000).astype(np.int64)
+        name = int(os.path.basename(path).split('_')[0])
+        results[name] = analyze_sequence(mhz, detections['frame'], \
+                                         config.max_period)
+    return dict(sorted(results.items()))
+
+def sequence_line(name, result):
+    """
+    One line of sequence.py output: the pattern and how often it was seen,
+    then the mean and variance of the frames between the hops in the
+    pattern and between any two hops.
+    """
+    pattern = result.pattern
+    return str(name) + ' ' + str([pattern.count, pattern.symbols]) + \
+           ' gaps ' + str(np.round(pattern.gaps, 1).tolist()) + \
+           ' var ' + str(np.round(result.gap_vars, 1).tolist()) + \
+           ' spacing ' + str(round(result.spacing, 1)) + \
+           ' var ' + str(round(result.spacing_var, 1))
+
+def print_sequences(results, debug=0):
+    """
+    Prints sequence_files results like sequence.py always has, the files
+    without a pattern to stderr.
+    """
+    for name, result in results.items():
+        if result is None:
+            print(str(name) + ' has too few hops to find a pattern', \
+                  file=sys.stderr)
+            continue
+
+        # Print how strongly the sequence repeats
+        if debug:
+            print(str(name) + ' period: ' + str(result.period) + \
+                  ' score: ' + str(result.score), file=sys.stderr)
+
+        print(sequence_line(name, result))
+
+def print_campaign(directory):
+    """
+    Prints the settings of every checkpointed run in directory and how far
+    it got through each capture.
+    """
+    from checkpoint import campaign
+
+    for run_id, manifest in campaign(directory).items():
+        print(run_id + ' ' + json.dumps(manifest['params'], sort_keys=True))
+        for name, entry in sorted(manifest['captures'].items()):
+            frames = sum(stop - start for start, stop in entry['ranges'])
+            print('    ' + name + ' ' + \
+                  ('complete' if entry['complete'] else 'partial') + ' ' + \
+                  str(len(entry['done'])) + '/' + str(len(entry['ranges'])) + \
+                  ' ranges ' + str(entry['frames_done']) + '/' + \
+                  str(frames) + ' frames, updated ' + entry['updated'])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='DroneHack hop detection')
+    parser.add_argument('--debug', action='store_true')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    detect = commands.add_parser('detect', help='find the hops in captures')
+    detect.add_argument('files', nargs='+', \
+                        help='captures, named by center frequency in MHz')
+    detect.add_argument('--data-dir', default='.')
+    detect.add_argument('--samp-rate', type=int, default=20000000)
+    detect.add_argument('-t', type=int, default=1000, help='frame size')
+    detect.add_argument('--bw', type=int, default=1800000, \
+                        help='channel bandwidth in Hz')
+    detect.add_argument('--delta', type=float, default=.1)
+    detect.add_argument('--cfar', type=float, default=None, \
+                        help='keep only peaks this many dB above the '
+                             'noise floor')
+    detect.add_argument('--floor-chunk', type=int, default=256)
+    detect.add_argument('--floor-history', type=int, default=8)
+    detect.add_argument('--floor-percentile', type=float, default=50.)
+    detect.add_argument('--overlap', type=int, default=0)
+    detect.add_argument('--window', default=None)
+    detect.add_argument('--front-end', default='fft', \
+                        choices=['fft', 'channelizer'])
+    detect.add_argument('--channels', type=int, default=None, \
+                        help='filter bank channels, samp_rate/bw by default')
+    detect.add_argument('--threshold', type=float, default=6., \
+                        help='channelizer energy threshold in dB')
+    detect.add_argument('--start-frame', type=int, default=0)
+    detect.add_argument('--stop-frame', type=int, default=None)
+    detect.add_argument('--cache-dir', default=None)
+    detect.add_argument('--cache-budget', type=float, default=20., \
+                        help='cache size limit in GB')
+    detect.add_argument('--cache-dtype', default='float32', \
+                        choices=['float32', 'float16'])
+    detect.add_argument('-j', '--jobs', type=int, default=1)
+    detect.add_argument('--min-job-frames', type=int, default=50000)
+    detect.add_argument('--checkpoint-dir', default=None, \
+                        help='save every frame range as it is done and '
+                             'resume from what is there')
+    detect.add_argument('--checkpoint-frames', type=int, default=50000)
+    detect.add_argument('--plot', default='off', \
+                        choices=['off', 'sampled', 'async'])
+    detect.add_argument('--plot-every', type=int, default=100)
+    detect.add_argument('--plot-top', type=int, default=None)
+    detect.add_argument('--plot-workers', type=int, default=2)
+    detect.add_argument('--output', default='npy', choices=['npy', 'text'])
+    detect.add_argument('--metrics', default=None, \
+                        help='file for the JSON metrics, - for stderr')
+    detect.add_argument('--progress', type=float, default=None, \
+                        help='print progress every this many seconds')
+
+    post = commands.add_parser('post-proc', help='clean up detections')
+    post.add_argument('file_num')
+    post.add_argument('--max-gap', type=int, default=700)
+    post.add_argument('--min-shift', type=int, default=900000)
+    post.add_argument('--corrections', default=None, \
+                      help='JSON rules file like corrections.json, or '
+                           '"MHz" : Hz with 0 Hz to drop')
+    post.add_argument('--no-text', action='store_true')
+
+    merge = commands.add_parser('merge', help='merge the captures into one '
+                                              'timeline')
+    merge.add_argument('files', nargs='+', \
+                       help='detections files.py wrote, by center frequency')
+    merge.add_argument('-o', '--output', default='merged')
+    merge.add_argument('--max-gap', type=int, default=700)
+    merge.add_argument('--min-shift', type=int, default=900000)
+    merge.add_argument('--merge-frames', type=int, default=100, \
+                       help='frames apart the copies of a hop can be')
+    merge.add_argument('--corrections', default=None, \
+                       help='JSON rules file with the capture offsets, '
+                            'like corrections.json')
+    merge.add_argument('--no-text', action='store_true')
+
+    sweep = commands.add_parser('sweep', help='run the chain for a grid of '
+                                              'settings')
+    sweep.add_argument('files', nargs='+', \
+                       help='captures, named by center frequency in MHz')
+    sweep.add_argument('--grid', action='append', default=[], \
+                       metavar='NAME=VALUE,...', \
+                       help='values of a setting (Config name) to try, '
+                            'one value to just set it. Repeat for more')
+    sweep.add_argument('--data-dir', default='.')
+    sweep.add_argument('--cache-dir', default='./spectra')
+    sweep.add_argument('--cache-budget', type=float, default=20., \
+                       help='cache size limit in GB')
+    sweep.add_argument('-j', '--jobs', type=int, default=1)
+    sweep.add_argument('--out', default=None, help='CSV file for the table')
+
+    status = commands.add_parser('status', help='what the checkpointed '
+                                                'runs have done')
+    status.add_argument('checkpoint_dir')
+
+    sequence = commands.add_parser('sequence', help='find hop patterns')
+    sequence.add_argument('directory', nargs='?', default='signals')
+    sequence.add_argument('--max-period', type=int, default=64)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'detect':
+        config = Config(samp_rate=args.samp_rate, t=args.t, bw=args.bw, \
+                        delta=args.delta, cfar_margin=args.cfar, \
+                        floor_chunk=args.floor_chunk, \
+                        floor_history=args.floor_history, \
+                        floor_percentile=args.floor_percentile, \
+                        overlap=args.overlap, \
+                        window=args.window, front_end=args.front_end, \
+                        n_channels=args.channels, \
+                        energy_threshold=args.threshold, \
+                        start_frame=args.start_frame, \
+                        stop_frame=args.stop_frame, data_dir=args.data_dir, \
+                        cache_dir=args.cache_dir, \
+                        cache_budget=int(args.cache_budget*2**30), \
+                        cache_dtype=args.cache_dtype, n_jobs=args.jobs, \
+                        min_job_frames=args.min_job_frames, \
+                        checkpoint_dir=args.checkpoint_dir, \
+                        checkpoint_frames=args.checkpoint_frames, \
+                        plot_mode=args.plot, plot_every=args.plot_every, \
+                        plot_top=args.plot_top, \
+                        plot_workers=args.plot_workers, \
+                        output_format=args.output, \
+                        metrics_file=args.metrics, \
+                        progress_every=args.progress, debug=int(args.debug))
+        detect_files(args.files, config)
+
+    elif args.command == 'post-proc':
+        corrections = None
+        if args.corrections is not None:
+            corrections = load_rules(args.corrections)
+        config = Config(max_gap=args.max_gap, min_shift=args.min_shift, \
+                        corrections=corrections, \
+                        export_text=not args.no_text)
+        post_process_file(args.file_num, config)
+
+    elif args.command == 'merge':
+        from merge import load_offsets
+        corrections = offsets = None
+        if args.corrections is not None:
+            corrections = load_rules(args.corrections)
+            offsets = load_offsets(args.corrections)
+        config = Config(max_gap=args.max_gap, min_shift=args.min_shift, \
+                        corrections=corrections, offsets=offsets, \
+                        merge_frames=args.merge_frames, \
+                        export_text=not args.no_text)
+        merge_files(args.files, args.output, config)
+
+    elif args.command == 'sequence':
+        config = Config(max_period=args.max_period, debug=int(args.debug))
+        print_sequences(sequence_files(args.directory, config), config.debug)
+
+    elif args.command == 'status':
+        print_campaign(args.checkpoint_dir)
+
+    elif args.command == 'sweep':
+        import sweep
+        try:
+            grid = sweep.parse_grid(args.grid)
+        except ValueError as e:
+            parser.error(str(e))
+        config = Config(data_dir=args.data_dir, cache_dir=args.cache_dir, \
+                        cache_budget=int(args.cache_budget*2**30), \
+                        n_jobs=args.jobs)
+        sweep.write_table(sweep.run_sweep(args.files, grid, config), grid, \
+                          csv_file=args.out)
+
+if __name__ == '__main__':
+    main()
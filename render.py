@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+"""
+import os
+import multiprocessing
+import numpy as np
+from capture import open_capture
+from spectrum import frame_spectra
+from peaks import peakdet
+
+# Where the images go. Each file gets a folder with its own name.
+image_dir = './images'
+
+def select_frames(detections, every=None, top=None):
+    """
+    Picks the frames to draw out of a detection array. By default every
+    frame with a detection, otherwise every every'th of those or the top
+    frames with the strongest detection.
+    """
+    # The strongest detection of each frame comes first in its frame
+    order = np.lexsort((-detections['magnitude'], detections['frame']))
+    frames = detections['frame'][order]
+    first = np.r_[True, frames[1:] != frames[:-1]] if len(frames) else \
+            np.zeros(0, dtype=bool)
+    frames = frames[first]
+    strongest = detections['magnitude'][order][first]
+
+    if top is not None:
+        return np.sort(frames[np.lexsort((frames, -strongest))[:top]]) \
+                 .tolist()
+    if every is not None:
+        return frames[::every].tolist()
+    return frames.tolist()
+
+def plot_frame(center_freq, frame, t=1000, overlap=0, window=None, \
+               delta=.1, show=False, data_dir='.'):
+    """
+    Draws the fft of a frame with the peaks (red) and relative maxima
+    (purple) the detection picked out and saves it as
+    <image_dir>/<center_freq>/<center_freq>_<frame>.png. The frame is read
+    back out of the capture (center_freq in data_dir) so detection doesn't
+    have to hold on to it.
+    """
+    # Only pay for matplotlib when something actually gets drawn
+    import matplotlib
+    if not show:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from scipy import signal
+
+    # Redo the fft and peak detection of just this frame. Frames count from 1
+    hop = t - overlap
+    samples = open_capture(os.path.join(data_dir, center_freq))
+    fft_mag = frame_spectra(samples[(frame-1)*hop:(frame-1)*hop + t], t, \
+                            overlap, window)[0]
+    freq = np.fft.fftfreq(t)
+    maxtab, mintab = peakdet(fft_mag, delta)
+
+    plt.plot(freq, fft_mag)
+    if len(maxtab) > 0:
+        argmax = signal.argrelmax(maxtab[:,1])
+        maxtab[:,0] = maxtab[:,0]/t
+        plt.scatter(maxtab[:,0], maxtab[:,1], color='red')
+        plt.scatter(maxtab[argmax[0],0], maxtab[argmax[0],1], color='purple')
+
+    if show:
+        plt.show()
+    else:
+        folder = os.path.join(image_dir, center_freq)
+        os.makedirs(folder, exist_ok=True)
+        plt.savefig(os.path.join(folder, center_freq + '_' + str(frame) + \
+                                 '.png'), bbox_inches='tight', dpi=90)
+
+    # Clear the figure for the next plot
+    plt.clf()
+
+# Render worker. Draws frames off the queue until it gets None.
+def _render_worker(queue):
+    for args, kwargs in iter(queue.get, None):
+        plot_frame(*args, **kwargs)
+
+class RenderPool:
+    """
+    Background processes drawing frames handed to them through a queue, so
+    that detection never waits on matplotlib or the disk.
+    """
+    def __init__(self, workers=2):
+        self.queue = multiprocessing.Queue()
+        self.workers = [multiprocessing.Process(target=_render_worker, \
+                                                args=(self.queue,)) \
+                        for _ in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    # Queue up a plot_frame call
+    def submit(self, *args, **kwargs):
+        self.queue.put((args, kwargs))
+
+    # Wait for the queue to be drawn and stop the workers
+    def close(self):
+        for worker in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+
+Plays a recorded capture back at real time pace, for testing stream.py.
+
+    python replay.py <capture> [fifo | file | - | tcp://:port] [options]
+
+With tcp://host:port we listen and send to the first client that connects,
+like a GNU Radio TCP server sink. The default output is stdout, e.g.
+
+    python replay.py 2460 | python stream.py - --center 2460
+"""
+import argparse
+import socket
+import sys
+import time
+from capture import sample_size
+
+def open_output(dest):
+    """
+    Opens where the samples go: '-' for stdout, tcp://host:port to wait for
+    a client, otherwise a FIFO or file path.
+    """
+    if dest == '-':
+        return sys.stdout.buffer
+    if dest.startswith('tcp://'):
+        host, port = dest[len('tcp://'):].rsplit(':', 1)
+        server = socket.create_server((host, int(port)))
+        conn, addr = server.accept()
+        server.close()
+        return conn.makefile('wb')
+    return open(dest, 'wb')
+
+def replay(path, out, samp_rate=20000000, chunk=.01, speed=1., loop=False):
+    """
+    Writes the capture at path to out chunk seconds at a time, never ahead
+    of real time (times speed). Returns the number of samples sent.
+    """
+    chunk_bytes = int(chunk*samp_rate)*sample_size
+    sent = 0
+    start = time.monotonic()
+
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(chunk_bytes)
+            if not data:
+                if loop:
+                    f.seek(0)
+                    continue
+                break
+            out.write(data)
+            out.flush()
+            sent += len(data)//sample_size
+
+            # Hold off until the samples sent so far are due
+            delay = start + sent/(samp_rate*speed) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    return sent
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Real time capture replay')
+    parser.add_argument('capture')
+    parser.add_argument('dest', nargs='?', default='-')
+    parser.add_argument('--samp-rate', type=int, default=20000000)
+    parser.add_argument('--speed', type=float, default=1., \
+                        help='multiple of real time to play at')
+    parser.add_argument('--loop', action='store_true')
+    args = parser.parse_args()
+
+    out = open_output(args.dest)
+    try:
+        sent = replay(args.capture, out, args.samp_rate, speed=args.speed, \
+                      loop=args.loop)
+    except BrokenPipeError:
+        sys.exit(0)
+    print('sent ' + str(sent) + ' samples', file=sys.stderr)
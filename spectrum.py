@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import fft
+
+# Number of frames handed to a single FFT call. 4096 frames of 1000
+# samples is about 65MB of FFT output, big enough that the per-call overhead
+# disappears and small enough that a whole capture never has to be expanded
+# at once.
+block_frames = 4096
+
+# Windows we know by name. Anything else can be passed in as an array of
+# length t.
+windows = {'hann'     : np.hanning,
+           'hamming'  : np.hamming,
+           'blackman' : np.blackman,
+           'bartlett' : np.bartlett,
+           }
+
+def get_window(window, t):
+    """
+    Returns the window coefficients for a frame of t samples, or None for the
+    rectangular window (what processInput always used).
+    """
+    if window is None:
+        return None
+    if isinstance(window, str):
+        try:
+            return windows[window](t)
+        except KeyError:
+            raise ValueError('Unknown window ' + window)
+    window = np.asarray(window)
+    if window.shape != (t,):
+        raise ValueError('Window must have length t')
+    return window
+
+def frame_count(n_samples, t, overlap=0):
+    """
+    Number of full frames of t samples, advancing t - overlap samples each
+    frame, that fit in n_samples.
+    """
+    hop = t - overlap
+    if hop <= 0:
+        raise ValueError('overlap must be smaller than t')
+    if n_samples < t:
+        return 0
+    return (n_samples - t)//hop + 1
+
+def frame_matrix(samples, t, overlap=0):
+    """
+    Returns a 2-D (frames x t) view of samples. No data is copied.
+    """
+    n = frame_count(len(samples), t, overlap)
+    # Without overlap this is just a reshape, otherwise stride over the
+    # sliding windows
+    if overlap == 0:
+        return samples[:n*t].reshape(n, t)
+    return sliding_window_view(samples, t)[::t - overlap][:n]
+
+def frame_spectra(samples, t, overlap=0, window=None):
+    """
+    Magnitude spectrum, abs(fft)/t, of every frame in samples. One FFT call
+    for the whole array, one row per frame.
+    """
+    frames = frame_matrix(samples, t, overlap)
+    window = get_window(window, t)
+    if window is not None:
+        frames = frames*window
+    # scipy's fft is several times quicker than numpy's on batches of short
+    # transforms, and it can reuse the windowed copy we just made
+    return np.abs(fft.fft(frames, axis=1, overwrite_x=window is not None))/t
+
+def iter_spectra(samples, t, overlap=0, window=None, block=block_frames, \
+                 stop=None):
+    """
+    Generator over the frame spectra of samples, block frames at a time.
+    Yields (first frame index, 2-D magnitude array). Frame indices start at 0.
+    stop limits processing to the frames before it.
+    """
+    hop = t - overlap
+    n = frame_count(len(samples), t, overlap)
+    if stop is not None:
+        n = min(n, stop)
+
+    for first in range(0, n, block):
+        last = min(first + block, n)
+        # Slice out just the samples this block of frames covers. Frames at
+        # the edge of the block overlap the next block when overlap > 0
+        chunk = samples[first*hop:(last - 1)*hop + t]
+        yield first, frame_spectra(chunk, t, overlap, window)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+
+Live hop detection on a stream of complex64 samples, like the output of a
+GNU Radio file sink pointed at a FIFO.
+
+    python stream.py <fifo | file | - | tcp://host:port> [options]
+
+Detections are printed as 'frame  frequency' lines as soon as each block of
+frames is processed. Use replay.py to feed a recorded capture in at real
+time pace.
+"""
+import argparse
+import json
+import socket
+import sys
+import time
+import numpy as np
+from capture import sample_type, read_into, skip_samples
+from spectrum import frame_count, frame_spectra
+from detect import detect_frames
+from noise import NoiseFloor
+from detections import write_text
+
+# Function for printing to the console while the output we want is being
+# redirected to a file
+def eprint(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+class StreamStats:
+    """
+    Counters for a streaming run.
+
+    samples    - samples processed
+    frames     - frames processed
+    detections - hops found
+    dropped    - samples thrown away to catch back up with real time
+    backlog    - seconds of samples we are behind real time
+    load       - processing time of the last block over the time it spans,
+                 above 1 we can't keep up
+    """
+    def __init__(self):
+        self.samples = 0
+        self.frames = 0
+        self.detections = 0
+        self.dropped = 0
+        self.backlog = 0.
+        self.load = 0.
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def __str__(self):
+        return json.dumps(self.as_dict())
+
+def open_stream(source):
+    """
+    Opens the sample source: '-' for stdin, tcp://host:port to connect to a
+    TCP server sink, otherwise a FIFO or file path.
+    """
+    if source == '-':
+        return sys.stdin.buffer
+    if source.startswith('tcp://'):
+        host, port = source[len('tcp://'):].rsplit(':', 1)
+        return socket.create_connection((host, int(port))).makefile('rb')
+    return open(source, 'rb', buffering=0)
+
+def stream_detect(f, emit, t=1000, overlap=0, window=None, delta=.1, \
+                  mapper=90, samp_rate=20000000, block=2000, \
+                  max_backlog=None, stats=None, progress=None, \
+                  floor=None, margin=12., center_freq=0):
+    """
+    Runs hop detection on the stream f a block of frames at a time and hands
+    the detections of every block to emit as soon as they are found. Latency
+    is one block, block*(t - overlap)/samp_rate seconds.
+
+    If max_backlog (seconds) is given and processing falls that far behind
+    real time, the samples we are behind on are dropped (and counted) so
+    the detections stay current. progress is called with the stats after
+    every block. With floor (a noise.NoiseFloor) only peaks margin dB above
+    the noise floor count, which follows gain changes as they happen.
+    Detections are handed over as detection arrays, center_freq (MHz) being
+    the center frequency of the stream.
+    """
+    if stats is None:
+        stats = StreamStats()
+
+    hop = t - overlap
+    buf = np.empty((block - 1)*hop + t, dtype=sample_type)
+    have = 0
+    frame = 0
+    start = None
+
+    while True:
+        # Wait for a full block, or the end of the stream
+        have += read_into(f, buf[have:])
+        finished = have < len(buf)
+        # Real time starts with the first samples, not when we started
+        # waiting for them. They came in live, so the first one arrived
+        # what they span before now
+        if start is None and have:
+            start = time.monotonic() - have/samp_rate
+
+        n = frame_count(have, t, overlap)
+        if n == 0:
+            break
+
+        tic = time.monotonic()
+        spectra = frame_spectra(buf[:(n - 1)*hop + t], t, overlap, window)
+        found = detect_frames(spectra, frame, delta, mapper, t, floor, \
+                              margin, center_freq, samp_rate)
+        emit(found)
+
+        # Move the samples the next frame starts with to the front
+        used = n*hop
+        buf[:have - used] = buf[used:have]
+        have -= used
+        frame += n
+
+        now = time.monotonic()
+        stats.samples += used
+        stats.frames += n
+        stats.detections += len(found)
+        stats.load = (now - tic)/(used/samp_rate)
+        stats.backlog = (now - start) - \
+                        (stats.samples + stats.dropped)/samp_rate
+
+        # Too far behind, skip ahead to real time. Whole frames are skipped
+        # so the frame numbers still give the time of each detection
+        if max_backlog is not None and stats.backlog > max_backlog:
+            skip = int(stats.backlog*samp_rate)//hop*hop
+            if skip > have:
+                skipped = have + skip_samples(f, skip - have)
+                stats.dropped += skipped
+                frame += skipped//hop
+                have = 0
+                # A partial frame left over at the end of the stream
+                finished = finished or skipped < skip
+
+        if progress is not None:
+            progress(stats)
+
+        if finished:
+            break
+
+    return stats
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Live hop detection')
+    parser.add_argument('source', help='FIFO, file, - for stdin or ' + \
+                                       'tcp://host:port')
+    parser.add_argument('--center', type=int, default=0, \
+                        help='center frequency in MHz')
+    parser.add_argument('--samp-rate', type=int, default=20000000)
+    parser.add_argument('-t', type=int, default=1000, help='frame size')
+    parser.add_argument('--delta', type=float, default=.1)
+    parser.add_argument('--cfar', type=float, default=None, \
+                        help='keep only peaks this many dB above the ' + \
+                             'noise floor')
+    parser.add_argument('--block', type=int, default=2000, \
+                        help='frames per block')
+    parser.add_argument('--max-backlog', type=float, default=None, \
+                        help='seconds behind real time before dropping ' + \
+                             'samples')
+    parser.add_argument('--stats', type=float, default=None, \
+                        help='print stats to stderr every this many seconds')
+    args = parser.parse_args()
+
+    # Same channel bandwidth as files.py
+    mapper = (1800000*args.t)/args.samp_rate
+
+    def emit(found):
+        write_text(sys.stdout, found)
+        sys.stdout.flush()
+
+    last = [time.monotonic()]
+    def progress(stats):
+        if args.stats is not None and \
+           time.monotonic() - last[0] >= args.stats:
+            last[0] = time.monotonic()
+            eprint(stats)
+
+    with open_stream(args.source) as f:
+        stats = stream_detect(f, emit, args.t, delta=args.delta, \
+                              mapper=mapper, samp_rate=args.samp_rate, \
+                              block=args.block, \
+                              max_backlog=args.max_backlog, \
+                              progress=progress, \
+                              floor=None if args.cfar is None else \
+                                    NoiseFloor(), \
+                              margin=args.cfar, center_freq=args.center)
+    eprint(stats)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+
+Parameter sweeps: the whole chain (detection, post-proc and sequence
+analysis) run for every combination of a grid of settings, with one table
+of what each combination found.
+
+    python pipeline.py sweep 2460 2465 --grid delta=.05,.1,.2 \\
+        --grid max_gap=350,700 --out sweep.csv -j 4
+
+The spectra only depend on the frame settings (t, overlap and window), so
+they are computed once for each of those and kept in the spectrum cache
+(see cache.py). Every worker reads them back from the same memory mapped
+files, which the OS shares between the processes, and no combination
+redoes an fft. Combinations that only differ in the post-proc and sequence
+settings share their detections as well, those settings being run one
+after the other on the detections of one job.
+"""
+import csv
+import itertools
+import sys
+import time
+import numpy as np
+from cleanup import load_rules
+from detections import Detections
+from patterns import analyze_sequence
+from pipeline import Config, capture_path, frame_ranges, post_process, \
+                     process_frames
+
+# Settings that change the spectra, and those that only need the detections
+spectrum_params = ['samp_rate', 't', 'overlap', 'window', 'cache_dtype']
+later_params = ['max_gap', 'min_shift', 'corrections', 'max_period']
+
+# Columns of the table after the settings
+columns = ['file', 'detections', 'cleaned', 'period', 'score', 'pattern', \
+           'count', 'spacing', 'seconds']
+
+def parse_grid(specs):
+    """
+    Turns 'name=value,value,...' strings into a dict of setting -> list of
+    values. Values are numbers where they can be, None, True or False for
+    none, true and false, and text otherwise.
+    """
+    grid = {}
+    for spec in specs:
+        name, _, values = spec.partition('=')
+        name = name.strip().replace('-', '_')
+        if name not in Config._fields:
+            raise ValueError('unknown setting ' + name)
+        grid[name] = [parse_value(value) for value in values.split(',')]
+    return grid
+
+def parse_value(value):
+    value = value.strip()
+    words = {'none' : None, 'true' : True, 'false' : False}
+    if value.lower() in words:
+        return words[value.lower()]
+    for kind in (int, float):
+        try:
+            return kind(value)
+        except ValueError:
+            pass
+    return value
+
+def combinations(grid):
+    """
+    Every combination of the values in grid, as a list of dicts, the last
+    setting changing fastest.
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) \
+            for values in itertools.product(*(grid[name] for name in names))]
+
+def fill_cache(file_names, config):
+    """
+    Computes the spectra of the frames config covers in every file, so the
+    workers only read them.
+    """
+    from cache import SpectrumCache
+
+    cache = SpectrumCache(config.cache_dir, config.cache_budget, \
+                          config.cache_dtype)
+    for name in file_names:
+        ranges = frame_ranges(name, config)
+        for first, spectra in cache.spectra(capture_path(name, config), \
+                                            config.t, config.overlap, \
+                                            config.window, ranges[0][0], \
+                                            ranges[-1][1]):
+            pass
+
+def evaluate(file_names, config, variants):
+    """
+    Detects the hops in every file with config, then post-processes and
+    analyzes them with each of the variants (dicts of post-proc and
+    sequence settings). Returns one table row (a dict) per variant and file.
+    """
+    rows = []
+    for name in file_names:
+        tic = time.perf_counter()
+        found = Detections()
+        for start, stop in frame_ranges(name, config):
+            found.extend(process_frames(name, start, stop, config)[0])
+        detect_time = time.perf_counter() - tic
+
+        for variant in variants:
+            tic = time.perf_counter()
+            later = config._replace(**variant)
+            # A rules file can be swept over by its name
+            if isinstance(later.corrections, str):
+                later = later._replace(corrections= \
+                                           load_rules(later.corrections))
+            cleaned = post_process(found.records, later)
+            mhz = np.round(cleaned['freq_hz']/1000000).astype(np.int64)
+            result = analyze_sequence(mhz, cleaned['frame'], later.max_period)
+
+            row = {'file' : name, 'detections' : len(found), \
+                   'cleaned' : len(cleaned)}
+            if result is not None:
+                row.update({'period'  : result.period,
+                            'score'   : round(result.score, 3),
+                            'pattern' : ' '.join(map(str, \
+                                                 result.pattern.symbols)),
+                            'count'   : result.pattern.count,
+                            'spacing' : round(result.spacing, 1),
+                            })
+            row['seconds'] = round(detect_time + time.perf_counter() - tic, 3)
+            rows.append((variant, row))
+    return rows
+
+def run_sweep(file_names, grid, config=Config()):
+    """
+    Runs every combination of grid (setting -> list of values) on top of
+    config over the files, config.n_jobs combinations and files at a time.
+    Returns the table as a list of dicts, one per combination and file,
+    holding the settings of the grid and the columns.
+    """
+    if config.cache_dir is None:
+        config = config._replace(cache_dir='./spectra')
+    # Each worker does a whole combination on its own
+    config = config._replace(output_format=None, plot_mode='off', \
+                             metrics_file=None, progress_every=None, \
+                             checkpoint_dir=None, debug=0)
+
+    # Split the grid into what needs its own detection run and what can be
+    # tried out on the detections of one
+    detect_grid = {name : values for name, values in grid.items() \
+                   if name not in later_params}
+    later_grid = {name : values for name, values in grid.items() \
+                  if name in later_params}
+    variants = combinations(later_grid)
+
+    # Spectra for every frame setting in the grid, in this process, before
+    # the workers start reading them
+    jobs = [config._replace(**combo) for combo in combinations(detect_grid)]
+    filled = set()
+    for job in jobs:
+        key = tuple(str(getattr(job, name)) for name in spectrum_params)
+        if job.front_end == 'fft' and key not in filled:
+            fill_cache(file_names, job)
+            filled.add(key)
+
+    # One task per combination and file
+    tasks = [(name, combo, job) for combo, job in \
+             zip(combinations(detect_grid), jobs) for name in file_names]
+    if config.n_jobs == 1:
+        results = [evaluate([name], job, variants) \
+                   for name, combo, job in tasks]
+    else:
+        from joblib import Parallel, delayed
+        results = Parallel(n_jobs=config.n_jobs)( \
+                      delayed(evaluate)([name], job, variants) \
+                      for name, combo, job in tasks)
+
+    table = []
+    for (name, combo, job), rows in zip(tasks, results):
+        for variant, row in rows:
+            settings = dict(combo, **variant)
+            table.append(dict({name : settings[name] for name in grid}, \
+                              **row))
+    return table
+
+def write_table(table, names, f=sys.stdout, csv_file=None):
+    """
+    Prints the sweep table with aligned columns and, given csv_file, writes
+    it there as CSV too. names are the settings of the grid.
+    """
+    header = list(names) + columns
+    lines = [[str(row.get(name, '')) for name in header] for row in table]
+    widths = [max([len(name)] + [len(line[i]) for line in lines]) \
+              for i, name in enumerate(header)]
+    for line in [header] + lines:
+        print('  '.join(item.rjust(width) for item, width in \
+                        zip(line, widths)), file=f)
+
+    if csv_file is not None:
+        with open(csv_file, 'w', newline='') as out:
+            writer = csv.DictWriter(out, header, restval='')
+            writer.writeheader()
+            writer.writerows(table)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+@authors: Samuel Arwood, Ian Hogan
+
+Synthetic frequency hopping captures with known hops, for benchmarks and
+for checking that faster code still finds the same hops.
+
+    python synth.py <capture> [seconds] [options]
+
+writes complex64 samples like a GNU Radio file sink to <capture> and the
+hops that are in it to <capture>_truth.npy. Name the capture after its
+center frequency and files.py can run on it directly.
+"""
+import argparse
+import numpy as np
+
+# Same sample rate and channel bandwidth as files.py
+samp_rate = 20000000
+bw = 1800000
+
+# One row per hop: the samples it spans and its frequency
+hop_dtype = np.dtype([('start', np.int64),
+                      ('stop', np.int64),
+                      ('freq_hz', np.int64)])
+
+def hop_schedule(n_samples, hops, dwell=.01, gap=.002, \
+                 samp_rate=samp_rate):
+    """
+    Hops through the frequencies in hops (Hz) in order, over and over, for
+    n_samples. Each hop lasts dwell seconds and is followed by gap seconds
+    of silence. Returns a hop_dtype array.
+    """
+    dwell = int(dwell*samp_rate)
+    step = dwell + int(gap*samp_rate)
+    starts = np.arange(0, n_samples, step, dtype=np.int64)
+
+    schedule = np.empty(len(starts), dtype=hop_dtype)
+    schedule['start'] = starts
+    schedule['stop'] = np.minimum(starts + dwell, n_samples)
+    schedule['freq_hz'] = np.resize(np.asarray(hops, dtype=np.int64), \
+                                    len(starts))
+    return schedule
+
+def fhss_samples(schedule, n_samples, center_freq=0, snr=0., \
+                 deviation=250000, symbol_rate=1000000, samp_rate=samp_rate, \
+                 seed=0):
+    """
+    Complex64 samples of an FSK signal hopping through schedule, in complex
+    white noise of unit power. Each hop is random +-deviation symbols around
+    the hop frequency, which spreads it over most of a channel the way the
+    real hops are. snr is the signal to noise ratio in dB over the whole
+    band. Frequencies in the schedule are absolute, center_freq (MHz) is
+    taken off them.
+    """
+    rng = np.random.default_rng(seed)
+    samples = np.empty(n_samples, dtype=np.complex64)
+
+    # Noise a chunk at a time so nothing bigger than the output is made
+    chunk = 1 << 22
+    for i in range(0, n_samples, chunk):
+        n = min(chunk, n_samples - i)
+        samples[i:i+n].real = rng.standard_normal(n, dtype=np.float32)
+        samples[i:i+n].imag = rng.standard_normal(n, dtype=np.float32)
+    samples *= np.float32(np.sqrt(.5))
+
+    amplitude = np.sqrt(10**(snr/10))
+    per_symbol = max(1, int(samp_rate/symbol_rate))
+    for start, stop, freq in schedule.tolist():
+        n = stop - start
+        symbols = rng.choice((-1, 1), -(-n//per_symbol))
+        inst = freq - center_freq*1000000 + \
+               deviation*np.repeat(symbols, per_symbol)[:n]
+        phase = rng.uniform(0, 2*np.pi) + 2*np.pi*np.cumsum(inst)/samp_rate
+        samples[start:stop] += (amplitude*np.exp(1j*phase)) \
+                               .astype(np.complex64)
+
+    return samples
+
+def frame_truth(schedule, n_frames, t=1000):
+    """
+    The hop frequency of every frame, numbered from 1 like files.py, and
+    whether the hop covers the whole frame. Index 0 is frame 1. Frames
+    without a hop in the middle of them get 0.
+    """
+    freqs = np.zeros(n_frames, dtype=np.int64)
+    full = np.zeros(n_frames, dtype=bool)
+    middle = np.arange(n_frames)*t + t//2
+
+    idx = np.searchsorted(schedule['start'], middle, side='right') - 1
+    inside = (idx >= 0) & (middle < schedule['stop'][np.maximum(idx, 0)])
+    freqs[inside] = schedule['freq_hz'][idx[inside]]
+
+    begin = np.arange(n_frames)*t
+    full[inside] = (begin[inside] >= schedule['start'][idx[inside]]) & \
+                   (begin[inside] + t <= schedule['stop'][idx[inside]])
+    return freqs, full
+
+def score(detections, schedule, n_frames, t=1000, bw=bw):
+    """
+    How well detections match the hops in schedule. A detection is right
+    when it is within bw/2 of the hop in its frame. Returns a dict with
+    precision, the fraction of detections in frames with a hop that are
+    right, and recall, the fraction of frames a hop fully covers with a
+    right detection.
+    """
+    freqs, full = frame_truth(schedule, n_frames, t)
+    frames = detections['frame'] - 1
+    valid = (frames >= 0) & (frames < n_frames)
+    frames = frames[valid]
+    found = detections['freq_hz'][valid]
+
+    truth = freqs[frames]
+    judged = truth != 0
+    right = judged & (np.abs(found - truth) <= bw//2)
+
+    hit = np.zeros(n_frames, dtype=bool)
+    hit[frames[right]] = True
+
+    return {'detections' : int(len(frames)),
+            'precision'  : float(right.sum()/max(judged.sum(), 1)),
+            'recall'     : float((hit & full).sum()/max(full.sum(), 1)),
+            }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Synthetic FHSS capture')
+    parser.add_argument('capture')
+    parser.add_argument('seconds', nargs='?', type=float, default=.5)
+    parser.add_argument('--center', type=int, default=2460, \
+                        help='center frequency in MHz')
+    parser.add_argument('--hops', type=int, nargs='+', \
+                        default=[2452, 2457, 2459, 2462, 2466], \
+                        help='hop frequencies in MHz, in hop order')
+    parser.add_argument('--dwell', type=float, default=.01)
+    parser.add_argument('--gap', type=float, default=.002)
+    parser.add_argument('--snr', type=float, default=0.)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    n = int(args.seconds*samp_rate)
+    schedule = hop_schedule(n, np.array(args.hops)*1000000, args.dwell, \
+                            args.gap)
+    fhss_samples(schedule, n, args.center, args.snr, seed=args.seed) \
+        .tofile(args.capture)
+    np.save(args.capture + '_truth.npy', schedule)